@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import matplotlib.pyplot as plt
+from fast_backtest import rolling_mean, backtest_signals, allocate_buffers
+from market_data import cached_download
 
 __author__ = "https://github.com/theredplanetsings"
 __date__ = "04/01/2025"
@@ -18,6 +18,8 @@ class StanWeinsteinTester():
         The start date for the historical data.
     end : str
         The end date for the historical data.
+    prefetched : DataFrame or None
+        An optional batched download to slice the symbol's data from.
     results : DataFrame
         The DataFrame containing the backtest results.
 
@@ -30,7 +32,7 @@ class StanWeinsteinTester():
     plot_results():
         Plots the cumulative returns of the buy-and-hold strategy and Stan Weinstein's strategy.
     """
-    def __init__(self, symbol, start, end):
+    def __init__(self, symbol, start, end, prefetched = None):
         """
         Constructs all the necessary attributes for the StanWeinsteinTester object.
 
@@ -42,11 +44,15 @@ class StanWeinsteinTester():
             The start date for the historical data.
         end : str
             The end date for the historical data.
+        prefetched : DataFrame, optional
+            A ticker-grouped frame from market_data.prefetch; if given we slice our symbol out of it instead of downloading.
         """
         self.symbol = symbol
         self.start = start
         self.end = end
+        self.prefetched = prefetched
         self.results = None
+        self._plot = None
         self.get_data()
 
     def get_data(self):
@@ -58,8 +64,13 @@ class StanWeinsteinTester():
         DataFrame
             A DataFrame containing the historical stock data, daily logarithmic returns, and the 30-week moving average.
         """
-        # grab historical stock data for our date range
-        frame = yf.download(self.symbol, start = self.start, end = self.end)
+        # grab historical stock data for our date range (reuse a batched download if we were given one)
+        if self.prefetched is not None:
+            frame = self.prefetched[self.symbol]
+        else:
+            # we only ever use the (split/dividend adjusted) close, so don't ask for or keep anything else
+            frame = cached_download(self.symbol, self.start, self.end, fields = ['Close'],
+                                  progress = False, auto_adjust = True, actions = False)
 
         # yfinance can return data in different formats, so let's sort that out
         if 'Close' in frame.columns:
@@ -74,19 +85,43 @@ class StanWeinsteinTester():
             else:
                 raise ValueError("No price columns found in the data")
 
-        # set up our dataframe with just the closing prices
-        dataSW = pd.DataFrame(frame[close_col])
-        dataSW.columns = ['Close']  # make sure the column name is consistent
-
-        # work out daily log returns (fancy way of calculating percentage changes)
-        dataSW['returns'] = np.log(dataSW['Close'].div(dataSW['Close'].shift(1)))
-        # calculate the 30-week moving average (30 weeks × 5 trading days = 150 days)
-        dataSW['SMA_30'] = dataSW['Close'].rolling(window = 30 * 5).mean()
+        # grab just the closing prices (multi-level columns hand us a one-column frame, so flatten that)
+        prices = frame[close_col]
+        if isinstance(prices, pd.DataFrame):
+            prices = prices.iloc[:, 0]
+        # the running-sum moving average can't step over gaps, so drop any missing closes first
+        prices = prices.dropna()
+
+        # bail out before doing any work if there aren't enough days to fill the 30-week window
+        if len(prices) <= 30 * 5:
+            raise ValueError("Not enough data for a 30-week moving average: only {} trading days between {} and {}".format(
+                len(prices), self.start, self.end))
+
+        # prices, returns and moving averages are all kept as float32 - daily closes only carry ~7 significant
+        # digits anyway, and it halves the memory traffic on every pass below
+        close = prices.to_numpy(dtype = np.float32)
+
+        # work out daily log returns as a straight log-diff into one preallocated buffer
+        # (the logs themselves are taken in float64 so the small daily differences don't lose precision)
+        log_close = np.log(close, dtype = np.float64)
+        returns = np.empty_like(close)
+        returns[:1] = np.nan  # no previous close for the first day
+        np.subtract(log_close[1:], log_close[:-1], out = returns[1:])
+
+        # build the dataframe in one go from the finished arrays, including
+        # the 30-week moving average (30 weeks × 5 trading days = 150 days)
+        dataSW = pd.DataFrame({
+            'Close': close,
+            'returns': returns,
+            'SMA_30': rolling_mean(close, 30 * 5),
+        }, index = prices.index)
         # get rid of any rows with missing data
         dataSW.dropna(inplace = True)
 
         # save this data so we can use it later
         self.data2 = dataSW
+        # working arrays for test_results, sized to this data and reused on every run until it's fetched again
+        self._buffers = allocate_buffers(len(dataSW))
         return dataSW
     
     def test_results(self):
@@ -98,40 +133,41 @@ class StanWeinsteinTester():
         tuple
             A tuple containing the performance of the strategy and its outperformance compared to the buy-and-hold strategy.
         """
-        dataSW = self.data2.copy().dropna()
+        # get_data already dropped the gaps and nothing below writes into this frame, so no defensive copy needed
+        dataSW = self.data2
         # create our trading signals: 1 means buy (price above 30-week average)
-        # -1 means sell (price below 30-week average) 
-        dataSW['position'] = np.where(dataSW['Close'] > dataSW['SMA_30'], 1, -1)
-        # work out how our strategy performs based on these positions
-        dataSW['strategy'] = dataSW['returns'] * dataSW['position'].shift(1)
-        dataSW.dropna(inplace = True)
-
-        # calculate cumulative returns - both for buy & hold and our strategy
-        dataSW['returnsB&H'] = dataSW['returns'].cumsum().apply(np.exp)
-        dataSW['returnstrategy'] = dataSW['strategy'].cumsum().apply(np.exp)
+        # -1 means sell (price below 30-week average), and work out how the strategy performs
+        # along with cumulative returns for buy & hold - all on plain numpy arrays
+        position, strategy, cum_bh, cum_strat = backtest_signals(
+            dataSW['returns'].to_numpy(), dataSW['Close'].to_numpy(), dataSW['SMA_30'].to_numpy(), out = self._buffers)
 
         # see how well our strategy did
-        perf = dataSW['returnstrategy'].iloc[-1]
-        outperf = perf - dataSW['returnsB&H'].iloc[-1]
-
-        # save this data for plotting later
-        self.results = dataSW
+        perf = cum_strat[-1]
+        outperf = perf - cum_bh[-1]
 
-        # calculate some extra stats we might need
-        ret = np.exp(dataSW['strategy'].sum())
-        std = dataSW['strategy'].std() * np.sqrt(252)
+        # save this data for plotting later (the first row has no previous position, so it's dropped)
+        self.results = dataSW.iloc[1:].assign(**{'position': position[1:], 'strategy': strategy[1:],
+                                                  'returnsB&H': cum_bh, 'returnstrategy': cum_strat})
+        # keep both curves side by side in one small C-contiguous (n, 2) array for plot_results
+        self._plot = np.column_stack([cum_bh, cum_strat])
 
-        return round(perf, 6), round(outperf, 6)
+        return round(float(perf), 6), round(float(outperf), 6)
     
     def plot_results(self):
         """
         Plots the cumulative returns of the buy-and-hold strategy and Stan Weinstein's strategy.
         """
+        # only pull in pyplot when plotting, the dashboard uses these classes without it
+        import matplotlib.pyplot as plt
         if self.results is None:
             print("Run the test!")
         else:
             title = "{} | Weinstein Strategy".format(self.symbol)
-            self.results[['returnsB&H', 'returnstrategy']].plot(title = title, figsize = (12,8))
+            plt.figure(figsize = (12,8))
+            plt.plot(self.results.index, self._plot[:, 0], label = 'returnsB&H')
+            plt.plot(self.results.index, self._plot[:, 1], label = 'returnstrategy')
+            plt.title(title)
+            plt.legend()
             plt.show()
 
 def test_case():
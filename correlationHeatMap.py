@@ -1,7 +1,7 @@
-import yfinance as yf
-import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+from market_data import cached_download
 
 __author__ = "https://github.com/theredplanetsings"
 __date__ = "04/01/2025"
@@ -32,29 +32,50 @@ stock_tickers = [
 
 # put them in alphabetical order to make the chart cleaner
 tickers_sorted = sorted(stock_tickers)
-# grab stock data from yfinance for our date range - just need adjusted close prices
-stocks = yf.download(tickers_sorted, start = "2020-01-01", end = "2023-01-01")['Adj Close']
+# grab stock data from yfinance (or the local cache) in one threaded batch - just need adjusted close prices,
+# which with auto_adjust is simply the Close column, so that's the only field we keep
+stocks = cached_download(tickers_sorted, "2020-01-01", "2023-01-01", fields = ['Close'], threads = True,
+                         progress = False, auto_adjust = True, actions = False)['Close']
 
-# work out how correlated each stock is with every other stock
-corr_matrix = stocks.corr()
+# work out how correlated each stock's daily returns are with every other stock's
+# (raw prices all trend over time, so they look correlated even when the day-to-day moves aren't)
+prices = stocks.dropna().to_numpy(dtype = np.float64)
+# column-major so each ticker's returns sit contiguously for the per-column standardising below
+returns = np.asfortranarray(prices[1:] / prices[:-1] - 1)
+returns -= returns.mean(axis = 0)
+returns /= returns.std(axis = 0, ddof = 1)
+# once everything is z-scored the whole correlation matrix is a single matrix multiply
+corr_matrix = pd.DataFrame((returns.T @ returns) / (returns.shape[0] - 1), index = stocks.columns, columns = stocks.columns)
 
-# create a nice heatmap to visualise the correlations
-plt.figure(figsize = (14, 10))
-sns.heatmap(corr_matrix, annot = True, cmap='Reds', vmin = -1, vmax = 1,
-            xticklabels = tickers_sorted, yticklabels = tickers_sorted)
-plt.title('Stock Correlation Heatmap')
-plt.xticks(rotation = 45, ha = 'right')
-plt.yticks(rotation = 0)
+# create a nice heatmap to visualise the correlations - imshow draws the whole matrix as one image
+labels = corr_matrix.columns.tolist()
+values = corr_matrix.to_numpy()
+k = len(labels)
+fig, ax = plt.subplots(figsize = (14, 10))
+im = ax.imshow(values, cmap = 'Reds', vmin = -1, vmax = 1, aspect = 'auto')
+fig.colorbar(im, ax = ax)
+# writing the value in every cell is the slow bit, so only bother when the grid is small enough to read
+if k <= 30:
+    for i in range(k):
+        for j in range(k):
+            ax.text(j, i, f"{values[i, j]:.2f}", ha = 'center', va = 'center', fontsize = 8)
+ax.set_xticks(range(k))
+ax.set_xticklabels(labels, rotation = 45, ha = 'right')
+ax.set_yticks(range(k))
+ax.set_yticklabels(labels, rotation = 0)
+ax.set_title('Stock Correlation Heatmap')
 plt.show()
 
 # find stocks that don't move together much (good for diversification)
 low_corr_threshold = 0.4
-# take away 1 because each stock is perfectly correlated with itself (obviously!)
-low_corr_counts = (np.abs(corr_matrix) < low_corr_threshold).sum(axis = 1) - 1 
+# build the low-correlation mask once for the whole matrix, blanking the diagonal
+# because each stock is perfectly correlated with itself (obviously!)
+low_corr_mask = np.abs(values) < low_corr_threshold
+np.fill_diagonal(low_corr_mask, False)
+low_corr_counts = low_corr_mask.sum(axis = 1)
 
 # show which stocks have the most low correlations (best for diversifying)
-for ticker in tickers_sorted:
-    low_corr_tickers = corr_matrix.index[(np.abs(corr_matrix[ticker]) < low_corr_threshold)
-    & (corr_matrix.index != ticker)].tolist()
-    count = len(low_corr_tickers)
-    print(f"{ticker}: {count} low correlations with {low_corr_tickers}")
+tickers = corr_matrix.index.to_numpy()
+for i, ticker in enumerate(tickers):
+    low_corr_tickers = tickers[low_corr_mask[i]].tolist()
+    print(f"{ticker}: {low_corr_counts[i]} low correlations with {low_corr_tickers}")
@@ -0,0 +1,219 @@
+import numpy as np
+from numba import njit, prange
+
+__author__ = "https://github.com/theredplanetsings"
+__date__ = "04/01/2025"
+
+@njit(cache = True, fastmath = True)
+def rolling_mean(x, w):
+    """
+    Simple moving average of a 1-D array using a single-pass running sum.
+
+    Parameters
+    ----------
+    x : ndarray
+        The price series.
+    w : int
+        The window length.
+
+    Returns
+    -------
+    ndarray
+        The moving average, NaN for the first w - 1 values (same as pandas' rolling(w).mean()).
+    """
+    out = np.empty_like(x)
+    out[:] = np.nan
+    if w < 1 or x.size < w:
+        return out
+    # seed the running sum with the first full window
+    s = 0.0
+    for i in range(w):
+        s += x[i]
+    out[w - 1] = s / w
+    # then just add the new value and drop the old one as we slide along
+    for i in range(w, x.size):
+        s += x[i] - x[i - w]
+        out[i] = s / w
+    return out
+
+def allocate_buffers(n, dtype = np.float32):
+    """
+    Preallocates the working arrays backtest_signals writes into, so repeated runs don't allocate every time.
+
+    Parameters
+    ----------
+    n : int
+        The number of rows being backtested.
+    dtype : dtype, optional
+        The dtype of the returns (the strategy buffer matches it).
+
+    Returns
+    -------
+    tuple
+        Empty (position, strategy, cum_bh, cum_strat) buffers to pass as backtest_signals' out argument.
+    """
+    return (np.empty(n, dtype = np.int8), np.empty(n, dtype = dtype),
+            np.empty(max(n - 1, 0)), np.empty(max(n - 1, 0)))
+
+def backtest_signals(returns, fast, slow, out = None):
+    """
+    Runs the long/short signal on raw arrays: long when fast is above slow, short otherwise.
+
+    Parameters
+    ----------
+    returns : ndarray
+        The daily log returns.
+    fast : ndarray
+        The faster-moving series (the close price, or the short moving average).
+    slow : ndarray
+        The slower-moving series (the moving average we're comparing against).
+    out : tuple, optional
+        Buffers from allocate_buffers to write the results into instead of allocating new arrays.
+
+    Returns
+    -------
+    tuple
+        position (int8) and strategy (same length as returns, strategy[0] is NaN), plus the cumulative buy & hold
+        and strategy returns starting from the second row, since the first row has no position to trade on yet.
+    """
+    if out is None:
+        out = allocate_buffers(returns.size, returns.dtype)
+    position, strategy, cum_bh, cum_strat = out
+
+    # positions are only ever +1/-1, so keep them as int8 (1 byte instead of 8 per day):
+    # write the 0/1 comparison straight into the buffer, then map it to -1/+1 in place
+    np.greater(fast, slow, out = position.view(np.bool_))
+    position *= 2
+    position -= 1
+    # today's return is earned on yesterday's position - just offset the slices, no shifted copy needed
+    strategy[:1] = np.nan
+    np.multiply(returns[1:], position[:-1], out = strategy[1:])
+    # returns may be float32, but the running totals are accumulated in float64 so 25 years of days don't drift
+    np.cumsum(returns[1:], dtype = np.float64, out = cum_bh)
+    np.exp(cum_bh, out = cum_bh)
+    np.cumsum(strategy[1:], dtype = np.float64, out = cum_strat)
+    np.exp(cum_strat, out = cum_strat)
+    return position, strategy, cum_bh, cum_strat
+
+@njit(cache = True)
+def backtest_sma(close, sma_s, sma_l):
+    """
+    The whole SMA crossover backtest fused into one pass over the closes - no intermediate arrays.
+
+    Agrees with SMABacktester.test_results to about 1e-6, not exactly: the daily log returns here are float64,
+    where test_results sums them after storing them as float32 (the Weinstein strategy is just sma_s = 1, sma_l = 150).
+
+    Parameters
+    ----------
+    close : ndarray
+        The closing prices, with no gaps.
+    sma_s : int
+        The period for the short-term moving average.
+    sma_l : int
+        The period for the long-term moving average.
+
+    Returns
+    -------
+    tuple
+        The strategy's cumulative return and its outperformance over buying & holding (NaN if there isn't enough data).
+    """
+    n = close.size
+    # first day both averages and a daily return exist, i.e. the first row of data2
+    start = max(sma_s, sma_l, 2) - 1
+    if n <= start + 1:
+        return np.nan, np.nan
+
+    sum_s = 0.0
+    sum_l = 0.0
+    log_bh = 0.0
+    log_strat = 0.0
+    prev_position = 0
+    for t in range(n):
+        # same running-sum updates as rolling_mean so the crossovers line up exactly
+        if t < sma_s:
+            sum_s += close[t]
+        else:
+            sum_s += close[t] - close[t - sma_s]
+        if t < sma_l:
+            sum_l += close[t]
+        else:
+            sum_l += close[t] - close[t - sma_l]
+
+        # returns only count from the second row of data2, traded on the previous day's position
+        if t > start:
+            r = np.log(np.float64(close[t])) - np.log(np.float64(close[t - 1]))
+            log_bh += r
+            log_strat += r * prev_position
+        if t >= start:
+            prev_position = 1 if sum_s / sma_s > sum_l / sma_l else -1
+
+    perf = np.exp(log_strat)
+    return perf, perf - np.exp(log_bh)
+
+@njit(parallel = True, cache = True)
+def sweep(close, short_windows, long_windows):
+    """
+    Runs backtest_sma for every (short, long) pair in parallel.
+
+    Only call this from one thread at a time: without TBB or OpenMP, Numba's fallback threading layer aborts the
+    process if two threads enter a parallel kernel together (the dashboard's sessions use sweep_serial instead).
+
+    Parameters
+    ----------
+    close : ndarray
+        The closing prices, with no gaps.
+    short_windows : ndarray
+        The short-term moving average periods.
+    long_windows : ndarray
+        The long-term moving average periods, paired up with short_windows.
+
+    Returns
+    -------
+    ndarray
+        An (n_pairs, 2) array of (performance, outperformance) for each pair.
+    """
+    out = np.empty((short_windows.size, 2))
+    for k in prange(short_windows.size):
+        perf, outperf = backtest_sma(close, short_windows[k], long_windows[k])
+        out[k, 0] = perf
+        out[k, 1] = outperf
+    return out
+
+@njit(cache = True)
+def sweep_serial(close, short_windows, long_windows):
+    """
+    The same as sweep but on a single thread, so it's safe to call from several threads at once (and a grid of a
+    few dozen pairs is quick either way).
+
+    Parameters
+    ----------
+    close : ndarray
+        The closing prices, with no gaps.
+    short_windows : ndarray
+        The short-term moving average periods.
+    long_windows : ndarray
+        The long-term moving average periods, paired up with short_windows.
+
+    Returns
+    -------
+    ndarray
+        An (n_pairs, 2) array of (performance, outperformance) for each pair.
+    """
+    out = np.empty((short_windows.size, 2))
+    for k in range(short_windows.size):
+        perf, outperf = backtest_sma(close, short_windows[k], long_windows[k])
+        out[k, 0] = perf
+        out[k, 1] = outperf
+    return out
+
+def warm_up():
+    """
+    Runs each kernel once on a tiny float32 series so Numba compiles them (or loads them from its cache) up front,
+    rather than on the first real backtest.
+    """
+    close = np.linspace(1, 2, 8).astype(np.float32)
+    rolling_mean(close, 3)
+    backtest_sma(close, 2, 3)
+    windows = (np.array([2], dtype = np.int64), np.array([3], dtype = np.int64))
+    sweep(close, *windows)
+    sweep_serial(close, *windows)
@@ -0,0 +1,171 @@
+import numpy as np
+from numba import njit
+
+__author__ = "https://github.com/theredplanetsings"
+__date__ = "04/01/2025"
+
+# These run on the dashboard's session threads, and two sessions can call them at once. Numba's parallel mode
+# aborts the whole process on concurrent calls unless TBB or OpenMP is installed, so they're plain single-threaded
+# loops - the inputs are a few dozen stocks, far too small for threads to pay off anyway.
+@njit(cache = True, fastmath = True)
+def annual_stats(prices, keep):
+    """
+    Annualised mean and standard deviation of each stock's daily returns, worked out straight from the prices.
+
+    The stocks are worked through one at a time, each in its own fused pass over its prices, so no returns array
+    is ever built.
+
+    Parameters
+    ----------
+    prices : ndarray
+        The (stocks, days) closing prices, one contiguous row per stock so each pass streams straight through memory.
+    keep : ndarray
+        Boolean mask of length days - 1, True for the daily returns to include (e.g. days where every stock traded).
+
+    Returns
+    -------
+    tuple
+        The annual mean return and annual risk (std, ddof = 1) of each stock, using 252 trading days per year.
+    """
+    k, n = prices.shape
+    mean = np.empty(k)
+    std = np.empty(k)
+    count = 0
+    for i in range(n - 1):
+        if keep[i]:
+            count += 1
+    if count < 2:
+        mean[:] = np.nan
+        std[:] = np.nan
+        return mean, std
+
+    for j in range(k):
+        # first pass for the mean, second for the spread around it (steadier than summing squares in one go)
+        s = 0.0
+        for i in range(1, n):
+            if keep[i - 1]:
+                s += np.float64(prices[j, i]) / prices[j, i - 1] - 1.0
+        m = s / count
+        s2 = 0.0
+        for i in range(1, n):
+            if keep[i - 1]:
+                d = np.float64(prices[j, i]) / prices[j, i - 1] - 1.0 - m
+                s2 += d * d
+        mean[j] = m * 252
+        std[j] = np.sqrt(s2 / (count - 1)) * np.sqrt(252.0)
+    return mean, std
+
+@njit(cache = True)
+def pairwise_corr(values):
+    """
+    Correlation of every pair of stocks over the days where both have a value, the same as DataFrame.corr().
+
+    Each pair gets its own means and spread over the days they share, so a stock that listed late (or has gaps)
+    doesn't drag NaNs into everybody else's correlations.
+
+    Parameters
+    ----------
+    values : ndarray
+        The (stocks, days) series (e.g. daily returns), one contiguous row per stock and NaN where a stock has no value.
+
+    Returns
+    -------
+    ndarray
+        The (stocks, stocks) float32 correlation matrix (NaN for pairs with no shared days or no spread).
+        The sums are still taken in float64, a correlation in [-1, 1] just doesn't need more than float32 to store.
+    """
+    k, n = values.shape
+    corr = np.empty((k, k), dtype = np.float32)
+    for i in range(k):
+        x = values[i]
+        for j in range(i + 1):
+            y = values[j]
+            # means over the shared days first, then the products of the deviations from them
+            count = 0
+            sx = 0.0
+            sy = 0.0
+            for t in range(n):
+                if not (np.isnan(x[t]) or np.isnan(y[t])):
+                    count += 1
+                    sx += x[t]
+                    sy += y[t]
+            if count < 1:
+                corr[i, j] = corr[j, i] = np.nan
+                continue
+            mx = sx / count
+            my = sy / count
+            sxx = 0.0
+            syy = 0.0
+            sxy = 0.0
+            for t in range(n):
+                if not (np.isnan(x[t]) or np.isnan(y[t])):
+                    dx = x[t] - mx
+                    dy = y[t] - my
+                    sxx += dx * dx
+                    syy += dy * dy
+                    sxy += dx * dy
+            divisor = np.sqrt(sxx * syy)
+            r = sxy / divisor if divisor != 0 else np.nan
+            # rounding can push a perfect correlation just past +/-1
+            corr[i, j] = corr[j, i] = min(max(r, -1.0), 1.0)
+    return corr
+
+@njit(cache = True)
+def corr_scan(corr, threshold, k, n_partners):
+    """
+    Everything the diversification section needs from a correlation matrix, in one pass over it.
+
+    Each row counts its low correlations, notes its first few low correlation partners and keeps its
+    own k highest correlations from the upper triangle, then the rows' top k are merged at the end.
+
+    Parameters
+    ----------
+    corr : ndarray
+        The (stocks, stocks) correlation matrix.
+    threshold : float
+        Correlations below this (in absolute value) count as low. A stock's correlation with itself never does.
+    k : int
+        How many of the highest correlated pairs to return.
+    n_partners : int
+        How many low correlation partners to note for each stock.
+
+    Returns
+    -------
+    tuple
+        Each stock's low correlation count, an (stocks, n_partners) array of its first partners' indices (-1 past
+        the last one), and the rows, columns and values of the k highest correlated pairs, highest first
+        (NaN pairs are skipped, and there are fewer than k if there aren't enough pairs).
+    """
+    n = corr.shape[0]
+    counts = np.zeros(n, dtype = np.int64)
+    partners = np.full((n, n_partners), -1, dtype = np.int64)
+    # each row's own top k, kept sorted highest first (-inf for the slots it hasn't filled)
+    row_vals = np.full((n, k), -np.inf)
+    row_cols = np.full((n, k), -1, dtype = np.int64)
+    for i in range(n):
+        for j in range(n):
+            c = corr[i, j]
+            if j != i and abs(c) < threshold:
+                if counts[i] < n_partners:
+                    partners[i, counts[i]] = j
+                counts[i] += 1
+            # each pair once, from the upper triangle
+            if j > i and not np.isnan(c) and c > row_vals[i, k - 1]:
+                slot = k - 1
+                while slot > 0 and c > row_vals[i, slot - 1]:
+                    row_vals[i, slot] = row_vals[i, slot - 1]
+                    row_cols[i, slot] = row_cols[i, slot - 1]
+                    slot -= 1
+                row_vals[i, slot] = c
+                row_cols[i, slot] = j
+
+    # only n * k candidates are left, so the merge is a plain sort (unfilled slots sort last)
+    flat_vals = row_vals.ravel()
+    flat_cols = row_cols.ravel()
+    order = np.argsort(-flat_vals)[:k]
+    filled = 0
+    for o in order:
+        if flat_cols[o] >= 0:
+            filled += 1
+    order = order[:filled]
+    return counts, partners, order // k, flat_cols[order], flat_vals[order]
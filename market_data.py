@@ -0,0 +1,179 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+__author__ = "https://github.com/theredplanetsings"
+__date__ = "04/01/2025"
+
+# downloaded price history gets stashed here as parquet so repeat runs skip yahoo entirely
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+# download options that don't change what comes back, so they're left out of the cache key
+_UNKEYED_OPTIONS = ('progress', 'threads')
+# company details we've looked up before, one row per symbol, so the info request only happens once a week
+META_PATH = os.path.join(CACHE_DIR, "symbol_meta.parquet")
+META_MAX_AGE = pd.Timedelta(days = 7)
+# the dashboard's sessions are threads in one process, so their updates to the table take turns
+_META_LOCK = threading.Lock()
+
+def cached_download(symbols, start, end, fields = None, **kwargs):
+    """
+    Wraps yf.download with an on-disk parquet cache keyed by the symbols, date range and download options.
+
+    Only ranges that ended before today are cached, anything still open is downloaded every time.
+
+    Parameters
+    ----------
+    symbols : str or list of str
+        The stock symbol(s) to download.
+    start : str
+        The start date for the historical data.
+    end : str
+        The end date for the historical data.
+    fields : list of str, optional
+        Only keep these price fields (e.g. ['Close']), so we don't hold or cache columns nobody uses.
+    **kwargs
+        Any extra yf.download options (these become part of the cache key).
+
+    Returns
+    -------
+    DataFrame
+        The historical data, exactly as yf.download returned it the first time (cut down to fields if given).
+        Open-ended ranges are always a fresh download.
+    """
+    # a range running up to today (or past it) is still filling in, so it's always fetched fresh -
+    # caching it would freeze it at the first run's data, and leave a new file behind every day
+    closed = end is not None and pd.Timestamp(end) < pd.Timestamp.today().normalize()
+    if closed:
+        names = [symbols] if isinstance(symbols, str) else list(symbols)
+        options = "".join("_{}-{}".format(k, v) for k, v in sorted(kwargs.items()) if k not in _UNKEYED_OPTIONS)
+        if fields is not None:
+            options += "_fields-{}".format("-".join(fields))
+        key = "{}_{}_{}{}".format("-".join(names), start, end, options)
+        # a few dozen tickers plus the options runs past the 255 byte filename limit, so the name is a hash of the
+        # key (after a short readable prefix to tell the files apart by eye)
+        prefix = "-".join(names)[:40]
+        path = os.path.join(CACHE_DIR, "{}_{}.parquet".format(prefix, hashlib.sha1(key.encode()).hexdigest()))
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+
+    frame = yf.download(symbols, start = start, end = end, **kwargs)
+    if fields is not None:
+        frame = frame[list(fields)]
+    # don't cache failed/empty downloads, we want to retry those next time
+    if closed and not frame.empty:
+        os.makedirs(CACHE_DIR, exist_ok = True)
+        frame.to_parquet(path, engine = 'pyarrow', compression = 'zstd')
+    return frame
+
+def prefetch(symbols, start, end):
+    """
+    Downloads several symbols in one batched request so the backtesters don't each pay their own round-trip.
+
+    Parameters
+    ----------
+    symbols : list of str
+        The stock symbols to download.
+    start : str
+        The start date for the historical data.
+    end : str
+        The end date for the historical data.
+
+    Returns
+    -------
+    DataFrame
+        The historical data grouped by ticker, so prefetched[symbol] gives that symbol's price columns.
+    """
+    return cached_download(list(symbols), start, end, threads = True, group_by = 'ticker',
+                           progress = False, auto_adjust = True, actions = False)
+
+def _fetch_info(symbol):
+    """One ticker.info request, cut down to the fields we keep in the table (None if the request fails)."""
+    try:
+        info = yf.Ticker(symbol).info
+    except Exception:
+        return None
+    market_cap = info.get('marketCap')
+    return pd.Series({'name': info.get('longName', symbol), 'sector': info.get('sector'),
+                      'industry': info.get('industry'),
+                      'market_cap': float(market_cap) if market_cap is not None else np.nan,
+                      'fetched': pd.Timestamp.now()})
+
+def cached_infos(symbols, max_workers = 16):
+    """
+    Looks up several symbols' company name, sector, industry and market cap, answering from a local parquet table
+    when we've fetched them in the last week (ticker.info is a slow request returning 100+ fields we don't use).
+
+    The symbols we don't have are requested side by side in a thread pool (each one is just waiting on Yahoo),
+    and the table is written once for the whole batch.
+
+    Parameters
+    ----------
+    symbols : list of str
+        The stock symbols to look up.
+    max_workers : int, optional
+        The most info requests to have in flight at once.
+
+    Returns
+    -------
+    dict
+        Each symbol's 'name', 'sector', 'industry' and 'market_cap' ('N/A' for anything Yahoo doesn't have,
+        or for everything but the name if the lookup failed).
+    """
+    symbols = list(dict.fromkeys(symbols))
+    meta = pd.read_parquet(META_PATH) if os.path.exists(META_PATH) else None
+    now = pd.Timestamp.now()
+    missing = [symbol for symbol in symbols
+               if meta is None or symbol not in meta.index or now - meta.at[symbol, 'fetched'] >= META_MAX_AGE]
+
+    rows = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers = min(max_workers, len(missing))) as pool:
+            # failed lookups stay out of the table so they're retried next time
+            rows = {symbol: row for symbol, row in zip(missing, pool.map(_fetch_info, missing)) if row is not None}
+    if rows:
+        fetched = pd.DataFrame(rows).T
+        with _META_LOCK:
+            # read the table again, another caller may have added its own rows while we were fetching
+            meta = pd.read_parquet(META_PATH) if os.path.exists(META_PATH) else None
+            meta = fetched if meta is None else pd.concat([meta.drop(index = list(rows), errors = 'ignore'), fetched])
+            meta = meta.astype({'market_cap': 'float64', 'fetched': 'datetime64[ns]'})
+            # write to a temp file of our own and swap it in, so a reader never sees half a table
+            os.makedirs(CACHE_DIR, exist_ok = True)
+            fd, tmp_path = tempfile.mkstemp(suffix = ".tmp", dir = CACHE_DIR)
+            os.close(fd)
+            try:
+                meta.to_parquet(tmp_path, engine = 'pyarrow', compression = 'zstd')
+                os.replace(tmp_path, META_PATH)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    details = {}
+    for symbol in symbols:
+        if meta is not None and symbol in meta.index:
+            details[symbol] = {key: value if not pd.isna(value) else 'N/A'
+                               for key, value in meta.loc[symbol].drop('fetched').items()}
+        else:
+            details[symbol] = {'name': symbol, 'sector': 'N/A', 'industry': 'N/A', 'market_cap': 'N/A'}
+    return details
+
+def cached_info(symbol):
+    """
+    Looks up a single symbol's company details, the same way as cached_infos.
+
+    Parameters
+    ----------
+    symbol : str
+        The stock symbol to look up.
+
+    Returns
+    -------
+    dict
+        The 'name', 'sector', 'industry' and 'market_cap' of the symbol ('N/A' for anything Yahoo doesn't have).
+    """
+    return cached_infos([symbol])[symbol]
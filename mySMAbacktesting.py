@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import matplotlib.pyplot as plt
+from fast_backtest import rolling_mean, backtest_signals, allocate_buffers, sweep as run_sweep
+from market_data import cached_download
 
 __author__ = "https://github.com/theredplanetsings"
 __date__ = "04/01/2025"
@@ -22,6 +22,8 @@ class SMABacktester():
         The start date for the historical data.
     end : str
         The end date for the historical data.
+    prefetched : DataFrame or None
+        An optional batched download to slice the symbol's data from.
     results : DataFrame
         The DataFrame containing the backtest results.
         
@@ -33,8 +35,10 @@ class SMABacktester():
         Generates trading signals, calculates strategy returns, and compares them to a buy-and-hold strategy.
     plot_results():
         Plots the cumulative returns of the buy-and-hold strategy and the moving average crossover strategy.
+    sweep(short_windows, long_windows):
+        Backtests many moving average pairs at once on the same price history.
     """
-    def __init__(self, symbol, SMA_S, SMA_L, start, end):
+    def __init__(self, symbol, SMA_S, SMA_L, start, end, prefetched = None):
         """
         Constructs all the necessary attributes for the SMABacktester object.
         
@@ -50,13 +54,17 @@ class SMABacktester():
             The start date for the historical data.
         end : str
             The end date for the historical data.
+        prefetched : DataFrame, optional
+            A ticker-grouped frame from market_data.prefetch; if given we slice our symbol out of it instead of downloading.
         """
         self.symbol = symbol
         self.SMA_S = SMA_S
         self.SMA_L = SMA_L
         self.start = start
         self.end = end
+        self.prefetched = prefetched
         self.results = None
+        self._plot = None
         self.get_data()
 
     def get_data(self):
@@ -68,8 +76,13 @@ class SMABacktester():
         DataFrame
             A DataFrame containing the historical stock data, daily logarithmic returns, and moving averages.
         """
-        # grab historical stock data for our date range
-        df = yf.download(self.symbol, start = self.start, end = self.end)
+        # grab historical stock data for our date range (reuse a batched download if we were given one)
+        if self.prefetched is not None:
+            df = self.prefetched[self.symbol]
+        else:
+            # we only ever use the (split/dividend adjusted) close, so don't ask for or keep anything else
+            df = cached_download(self.symbol, self.start, self.end, fields = ['Close'],
+                                  progress = False, auto_adjust = True, actions = False)
 
         # yfinance can be a bit inconsistent with column names, so let's handle that
         if 'Close' in df.columns:
@@ -84,21 +97,49 @@ class SMABacktester():
             else:
                 raise ValueError("No price columns found in the data")
 
-        # set up our dataframe with just the closing prices
-        data = pd.DataFrame(df[close_col])
-        data.columns = ['Close']  # make sure the column name is consistent
-        
-        # work out daily log returns
-        data['returns'] = np.log(data['Close'].div(data['Close'].shift(1)))
-        # calculate the short-term moving average
-        data['SMA_S'] = data['Close'].rolling(int(self.SMA_S)).mean()
-        # calculate the long-term moving average  
-        data['SMA_L'] = data['Close'].rolling(int(self.SMA_L)).mean()
+        # grab just the closing prices (multi-level columns hand us a one-column frame, so flatten that)
+        prices = df[close_col]
+        if isinstance(prices, pd.DataFrame):
+            prices = prices.iloc[:, 0]
+        # the running-sum moving average can't step over gaps, so drop any missing closes first
+        prices = prices.dropna()
+
+        # bail out before doing any work if there aren't enough days to fill the long window
+        # (everything would just get dropped as NaN at the end anyway)
+        sma_s = int(self.SMA_S)
+        sma_l = int(self.SMA_L)
+        if len(prices) <= max(sma_s, sma_l):
+            raise ValueError("Not enough data for a {}-day moving average: only {} trading days between {} and {}".format(
+                max(sma_s, sma_l), len(prices), self.start, self.end))
+
+        # prices, returns and moving averages are all kept as float32 - daily closes only carry ~7 significant
+        # digits anyway, and it halves the memory traffic on every pass below
+        close = prices.to_numpy(dtype = np.float32)
+
+        # work out daily log returns as a straight log-diff into one preallocated buffer
+        # (the logs themselves are taken in float64 so the small daily differences don't lose precision)
+        log_close = np.log(close, dtype = np.float64)
+        returns = np.empty_like(close)
+        returns[:1] = np.nan  # no previous close for the first day
+        np.subtract(log_close[1:], log_close[:-1], out = returns[1:])
+        # keep the full close series around for parameter sweeps (data2 gets trimmed to SMA_L below)
+        self.close = close
+
+        # build the dataframe in one go from the finished arrays rather than adding columns one at a time:
+        # the short-term moving average (a 1-day average is just the price itself) and the long-term one
+        data = pd.DataFrame({
+            'Close': close,
+            'returns': returns,
+            'SMA_S': close if sma_s == 1 else rolling_mean(close, sma_s),
+            'SMA_L': rolling_mean(close, sma_l),
+        }, index = prices.index)
 
         # clean up any rows with missing data
         data.dropna(inplace = True)
         # save this data for later use
         self.data2 = data
+        # working arrays for test_results, sized to this data and reused on every run until it's fetched again
+        self._buffers = allocate_buffers(len(data))
         return data
 
     def test_results(self):
@@ -110,41 +151,66 @@ class SMABacktester():
         tuple
             A tuple containing the performance of the strategy and its outperformance compared to the buy-and-hold strategy.
         """
-        # work with a copy of our prepared data
-        data = self.data2.copy().dropna()
+        # work with our prepared data directly - get_data already dropped the gaps and
+        # nothing below writes into this frame, so there's no need for a defensive copy
+        data = self.data2
         # create trading signals based on moving average crossovers:
         # 1 means buy (short MA above long MA)
         # -1 means sell (short MA below long MA)
-        data['position'] = np.where(data['SMA_S'] > data['SMA_L'], 1, -1)
-        # calculate how our strategy performs based on these positions
-        data['strategy'] = data['returns'] * data['position'].shift(1)
-        data.dropna(inplace=True)
-        # work out cumulative returns for both buy & hold and our strategy
-        data['returnsB&H'] = data['returns'].cumsum().apply(np.exp)
-        data['returnstrategy'] = data['strategy'].cumsum().apply(np.exp)
+        # then work out strategy and buy & hold cumulative returns - all on plain numpy arrays
+        position, strategy, cum_bh, cum_strat = backtest_signals(
+            data['returns'].to_numpy(), data['SMA_S'].to_numpy(), data['SMA_L'].to_numpy(), out = self._buffers)
 
         # see how well our strategy performed
-        perf = data['returnstrategy'].iloc[-1]
-        outperf = perf - data['returnsB&H'].iloc[-1]
+        perf = cum_strat[-1]
+        outperf = perf - cum_bh[-1]
 
-        # save the results for plotting later
-        self.results = data
+        # save the results for plotting later (the first row has no previous position, so it's dropped)
+        self.results = data.iloc[1:].assign(**{'position': position[1:], 'strategy': strategy[1:],
+                                                'returnsB&H': cum_bh, 'returnstrategy': cum_strat})
+        # keep both curves side by side in one small C-contiguous (n, 2) array for plot_results
+        self._plot = np.column_stack([cum_bh, cum_strat])
         
-        # calculate some extra stats we might need
-        ret = np.exp(data['strategy'].sum())
-        std = data['strategy'].std() * np.sqrt(252)
         # return how well we did compared to just buying and holding
-        return round(perf, 6), round(outperf, 6)
+        return round(float(perf), 6), round(float(outperf), 6)
+
+    def sweep(self, short_windows, long_windows):
+        """
+        Backtests every (short, long) moving average pair on this symbol's prices in one parallel Numba pass.
+
+        Parameters
+        ----------
+        short_windows : list of int
+            The short-term moving average periods.
+        long_windows : list of int
+            The long-term moving average periods, paired up with short_windows.
+
+        Returns
+        -------
+        DataFrame
+            The performance and outperformance of each pair (matching test_results to about 1e-6), indexed by (SMA_S, SMA_L).
+        """
+        shorts = np.asarray(short_windows, dtype = np.int64)
+        longs = np.asarray(long_windows, dtype = np.int64)
+        out = run_sweep(self.close, shorts, longs)
+        index = pd.MultiIndex.from_arrays([shorts, longs], names = ['SMA_S', 'SMA_L'])
+        return pd.DataFrame(out.round(6), index = index, columns = ['perf', 'outperf'])
 
     def plot_results(self):
         """
         Plots the cumulative returns of the buy-and-hold strategy and the moving average crossover strategy.
         """
+        # only pull in pyplot when plotting, the dashboard uses these classes without it
+        import matplotlib.pyplot as plt
         if self.results is None:
             print("Run the test please")
         else:
             title = "{} | SMA_S = {} | SMA_L{}".format(self.symbol, self.SMA_S, self.SMA_L)
-            self.results[['returnsB&H','returnstrategy']].plot(title = title, figsize = (12,8))
+            plt.figure(figsize = (12,8))
+            plt.plot(self.results.index, self._plot[:, 0], label = 'returnsB&H')
+            plt.plot(self.results.index, self._plot[:, 1], label = 'returnstrategy')
+            plt.title(title)
+            plt.legend()
             plt.show()
             
 def test_case():
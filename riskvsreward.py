@@ -1,8 +1,14 @@
-import yfinance as yf
-import seaborn as sns
-import matplotlib.pyplot as plt
+import os
+import matplotlib
 import numpy as np
 import pandas as pd
+from market_data import cached_download
+from fast_stats import annual_stats
+
+# set SHOW_PLOTS=0 for headless/batch runs - the figure gets saved as a png instead of opening a window
+SHOW_PLOTS = bool(int(os.environ.get('SHOW_PLOTS', '1')))
+if not SHOW_PLOTS:
+    matplotlib.use('Agg')
 
 __author__ = "https://github.com/theredplanetsings"
 __date__ = "04/01/2025"
@@ -33,30 +39,72 @@ stock_tickers = [
 
 # put them in alphabetical order to keep things tidy
 tickers_sorted = sorted(stock_tickers)
-# grab stock data from yfinance - just need adjusted close prices
-stocks = yf.download(tickers_sorted, start="2020-01-01", end="2023-01-01")['Adj Close']
-
-# normalise all prices to start at 100 so we can compare them fairly
-norm_close = stocks.div(stocks.iloc[0]).mul(100)
-norm_close.plot(figsize=(15, 8), fontsize=12)
-plt.legend(fontsize=12)
-plt.show()
-
-# work out daily returns for each stock
-returns = stocks.pct_change().dropna()
-
-# create a summary table with mean and standard deviation
-summary = returns.describe().T.loc[:, ["mean", "std"]]
-
-# scale up to annual figures (252 trading days per year)
-summary["mean"] = summary["mean"] * 252
-summary["std"] = summary["std"] * np.sqrt(252)
-
-# create a scatter plot showing risk vs reward
-summary.plot.scatter(x = 'std', y = 'mean', figsize = (15, 8), fontsize = 12)
-for i in summary.index:
-    plt.annotate(i, xy = (summary.loc[i, "std"] + 0.002, summary.loc[i, "mean"] + 0.002), size = 11)
-plt.xlabel("Annual risk (std)", fontsize = 15)
-plt.ylabel("Annual return", fontsize = 15)
-plt.title("Risk/return", fontsize = 25)
-plt.show()
+# grab stock data from yfinance (or the local cache after the first run) in one threaded batch
+# with no progress bar - just need adjusted close prices, which with auto_adjust is simply the Close column,
+# so that's the only field we keep
+stocks = cached_download(tickers_sorted, "2020-01-01", "2023-01-01", fields = ['Close'], threads = True,
+                         progress = False, auto_adjust = True, actions = False)['Close']
+
+# pull the prices out once as a plain array, everything below works on it directly -
+# float32 is plenty for prices and daily returns and halves the memory of norm_close,
+# and it's transposed to one contiguous row per stock so each stock's history streams straight through
+prices = np.ascontiguousarray(stocks.to_numpy(dtype = np.float32).T)
+
+# normalise all prices to start at 100 so we can compare them fairly (one new array, scaled in place)
+norm = prices / prices[:, :1]
+norm *= 100
+norm_close = pd.DataFrame(norm.T, index = stocks.index, columns = stocks.columns)
+
+# skip any day where a stock has no price, on either side of the return (same rows as pct_change().dropna())
+missing = np.isnan(prices).any(axis = 0)
+keep = ~(missing[1:] | missing[:-1])
+
+# create a summary table with the mean and standard deviation of the daily returns scaled up to annual figures
+# (252 trading days per year) - the returns are worked out on the fly in one fused pass per stock
+mean, std = annual_stats(prices, keep)
+summary = pd.DataFrame({"mean": mean, "std": std}, index = stocks.columns)
+
+def finish_plot(filename):
+    """
+    Shows the current figure, or saves it to a (low dpi) png and closes it when SHOW_PLOTS is off.
+
+    Parameters
+    ----------
+    filename : str
+        Where to save the figure if we're not showing it.
+    """
+    import matplotlib.pyplot as plt
+    if SHOW_PLOTS:
+        plt.show()
+    else:
+        plt.savefig(filename, dpi = 80)
+        plt.close()
+
+def plot_results():
+    """
+    Plots the normalised prices next to the annual risk vs return of each stock, in one figure.
+    """
+    # pyplot (and its backend) is only loaded once we actually draw, so importing the stats stays light
+    import matplotlib.pyplot as plt
+    # both charts share one figure so the backend and canvas only get set up once
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize = (30, 8))
+
+    norm_close.plot(ax = ax1, fontsize = 12)
+    ax1.legend(fontsize = 12)
+
+    # create a scatter plot showing risk vs reward, straight from the stats arrays rather than through pandas
+    ax2.scatter(std, mean)
+    ax2.tick_params(labelsize = 12)
+    # offset all the label positions in one go, then just walk the arrays
+    xs = std + 0.002
+    ys = mean + 0.002
+    for label, x, y in zip(summary.index, xs, ys):
+        ax2.annotate(label, xy = (x, y), size = 11)
+    ax2.set_xlabel("Annual risk (std)", fontsize = 15)
+    ax2.set_ylabel("Annual return", fontsize = 15)
+    ax2.set_title("Risk/return", fontsize = 25)
+    finish_plot('risk_return.png')
+
+# only draw the figure when run as a script, so summary and norm_close can be imported without them
+if __name__ == '__main__':
+    plot_results()
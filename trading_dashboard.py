@@ -2,11 +2,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import yfinance as yf
-import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.graph_objects as go
-import plotly.express as px
-from datetime import datetime, date
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from market_data import cached_download, cached_info, cached_infos
+from fast_stats import annual_stats, corr_scan, pairwise_corr
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -23,6 +23,18 @@ except ImportError:
     st.error("mySMAbacktesting module not found. Please ensure all files are in the same directory.")
     SMABacktester = None
 
+try:
+    from fast_backtest import sweep_serial, warm_up
+except ImportError:
+    sweep_serial = warm_up = None
+
+# Optional compiled MinMaxLTTB for downsampling the charts (LTTB run on a min/max preselection of the points,
+# near enough the same picks for a fraction of the work), falls back to the NumPy LTTB below
+try:
+    from tsdownsample import MinMaxLTTBDownsampler
+except ImportError:
+    MinMaxLTTBDownsampler = None
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="Trading Tools Dashboard",
@@ -31,8 +43,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
+@st.cache_resource(show_spinner=False)
+def compile_kernels():
+    """Compile the Numba backtest and stats kernels once per server process, so nobody's first run pays for it"""
+    # The kernels are JIT-compiled with cache=True rather than built ahead of time, so after the first start this
+    # only loads their saved machine code from __pycache__ (and stays portable across platforms and Python builds)
+    if warm_up is not None:
+        warm_up()
+    annual_stats(np.ones((2, 3), dtype=np.float32), np.ones(2, dtype=np.bool_))
+    pairwise_corr(np.ones((2, 3), dtype=np.float32))
+    # The matrix comes out of a DataFrame as a read-only view, which Numba compiles separately
+    corr = np.eye(2, dtype=np.float32)
+    corr.flags.writeable = False
+    corr_scan(corr, 0.5, 5, 5)
+
+compile_kernels()
+
+# Custom CSS for better styling, built once at import rather than as a fresh literal in every rerun
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -79,7 +107,17 @@ st.markdown("""
         color: #721c24;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+# Streamlit clears anything a rerun doesn't draw again, so the styles still have to be sent each run
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Page footer, plain HTML with nothing for the markdown parser to do, so it goes out through st.html
+FOOTER_HTML = """
+<div style='text-align: center; color: #666;'>
+    Trading Tools Dashboard | Built with Streamlit | 
+    <a href='https://github.com/theredplanetsings' target='_blank'>GitHub</a>
+</div>
+"""
 
 # Sidebar for navigation
 st.sidebar.title("Trading Tools Dashboard")
@@ -88,30 +126,543 @@ page = st.sidebar.radio(
     ["Home", "Stan Weinstein Strategy", "SMA Backtesting", "Risk vs Reward", "Correlation Heatmap"]
 )
 
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def download_chunk(symbols, start=None, end=None, period=None, interval="1d", refresh=0):
+    """One bulk request for up to 20 symbols, cached on its own so a changed ticker list only refetches its chunks"""
+    # refresh isn't used, it's only part of the cache key, so bumping it forces a new download
+    # Only pass the range arguments we were given, yfinance treats start/end and period differently
+    kwargs = {'start': start, 'end': end, 'period': period}
+    kwargs = {k: v for k, v in kwargs.items() if v is not None}
+    # threads=True only runs about two requests per CPU core, which leaves a small cloud box mostly waiting,
+    # so give every symbol in the chunk its own thread (yf.download itself isn't safe to call concurrently)
+    data = yf.download(list(symbols), interval=interval, group_by='ticker', auto_adjust=False,
+                       progress=False, threads=len(symbols), **kwargs)
+    # float32 is plenty for prices and halves what we cache, compute on and send to the charts
+    return data.astype({col: np.float32 for col in data.select_dtypes('float64').columns})
+
+def download_prices(symbols, start=None, end=None, period=None, interval="1d", refresh=0):
+    """Download price history for a sorted tuple of symbols, cached so reruns skip the network"""
+    # Grouped by ticker and at most 20 symbols per bulk request, stitched back together side by side
+    frames = [download_chunk(symbols[i:i + 20], start, end, period, interval, refresh)
+              for i in range(0, len(symbols), 20)]
+    return pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_history(symbol, start, end):
+    """Adjusted closes for one symbol, downloaded once and shared read-only by every backtest run on it"""
+    # Ranges ending today or later skip the disk cache, so for those the ttl here is what brings in new days
+    data = cached_download(symbol, start, end, fields=['Close'], progress=False, auto_adjust=True, actions=False)
+    # Raising keeps a failed download out of the cache so the next run retries it
+    if data.empty:
+        raise ValueError(f"No data found for {symbol} between {start} and {end}")
+    return data
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_weinstein(symbol, start, end):
+    """Run the Stan Weinstein backtest, cached by symbol and date range"""
+    tester = StanWeinsteinTester(symbol, start, end, prefetched={symbol: load_history(symbol, start, end)})
+    perf, outperf = tester.test_results()
+    return tester.results, perf, outperf
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_sma(symbol, sma_short, sma_long, start, end):
+    """Run the SMA crossover backtest, cached by symbol, windows and date range"""
+    tester = SMABacktester(symbol, sma_short, sma_long, start, end,
+                           prefetched={symbol: load_history(symbol, start, end)})
+    perf, outperf = tester.test_results()
+    return tester.results, perf, outperf
+
+# Moving average periods tried by the SMA page's grid search
+GRID_SHORTS = (5, 10, 15, 20, 30, 50, 75, 100)
+GRID_LONGS = (50, 100, 150, 200, 250, 300, 350, 400)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_sma_grid(symbol, start, end):
+    """Backtest every short < long pair of the grid in one Numba sweep, as a shorts x longs table of returns"""
+    # The grid doesn't depend on the page's own windows, so it's just the closes (gaps dropped, float32,
+    # the same series SMABacktester works on) without building a backtester and its moving averages
+    prices = load_history(symbol, start, end)['Close']
+    if isinstance(prices, pd.DataFrame):
+        prices = prices.iloc[:, 0]
+    close = prices.dropna().to_numpy(dtype=np.float32)
+    pairs = [(short, long) for short in GRID_SHORTS for long in GRID_LONGS if short < long]
+    shorts = np.array([short for short, _ in pairs], dtype=np.int64)
+    longs = np.array([long for _, long in pairs], dtype=np.int64)
+    # Sessions run on their own threads, so this uses the single-threaded sweep (see fast_backtest.sweep)
+    perf = pd.Series(sweep_serial(close, shorts, longs)[:, 0].round(6),
+                     index=pd.MultiIndex.from_arrays([shorts, longs], names=['SMA_S', 'SMA_L']))
+    return perf.unstack('SMA_L').reindex(index=list(GRID_SHORTS), columns=list(GRID_LONGS))
+
+def frame_fingerprint(frame):
+    """A cheap stand-in for a frame's contents in a cache key: its shape, last index label and last row"""
+    if frame.empty:
+        return (frame.shape,)
+    return (frame.shape, frame.index[-1], tuple(frame.iloc[-1].tolist()))
+
+# Figures are kept as live objects with st.cache_resource - st.cache_data would unpickle (and so re-validate every
+# trace of) a fresh copy on each rerun, and st.plotly_chart only reads the figure it's given.
+# The leading underscore keeps the results frame out of the cache key (hashing it all would cost a good part of
+# drawing it), so a cheap fingerprint of it goes in instead - a rerun of the backtest after its own cache expires
+# then gets a fresh chart rather than the old curve next to the new numbers
+# Line traces are Scattergl, so the browser draws them with WebGL rather than building an SVG path each
+@st.cache_resource(max_entries=20, show_spinner=False)
+def build_weinstein_fig(_results, symbol, start, end, fingerprint):
+    """Weinstein strategy vs buy & hold chart for one run, built once and reused on every rerun"""
+    # Create interactive plot with Plotly
+    fig = go.Figure()
+    points = lttb_xy(_results, ['returnsB&H', 'returnstrategy'])
+
+    fig.add_trace(go.Scattergl(
+        **points['returnsB&H'],
+        mode='lines',
+        name='Buy & Hold',
+        line=dict(color='blue', width=2)
+    ))
+
+    fig.add_trace(go.Scattergl(
+        **points['returnstrategy'],
+        mode='lines',
+        name='Weinstein Strategy',
+        line=dict(color='red', width=2)
+    ))
+
+    fig.update_layout(
+        title=f"{symbol} - Stan Weinstein Strategy vs Buy & Hold",
+        xaxis_title="Date",
+        yaxis_title="Cumulative Returns",
+        hovermode='x unified',
+        height=500
+    )
+
+    return fig
+
+@st.cache_resource(max_entries=20, show_spinner=False)
+def build_sma_returns_fig(_results, symbol, sma_short, sma_long, start, end, fingerprint):
+    """Returns comparison chart for one SMA run, built once and reused on every rerun"""
+    # Performance comparison chart
+    fig = go.Figure()
+    points = lttb_xy(_results, ['returnsB&H', 'returnstrategy'])
+
+    fig.add_trace(go.Scattergl(
+        **points['returnsB&H'],
+        mode='lines',
+        name='Buy & Hold',
+        line=dict(color='blue', width=2)
+    ))
+
+    fig.add_trace(go.Scattergl(
+        **points['returnstrategy'],
+        mode='lines',
+        name=f'SMA Strategy ({sma_short}/{sma_long})',
+        line=dict(color='red', width=2)
+    ))
+
+    fig.update_layout(
+        title=f"{symbol} - SMA Strategy vs Buy & Hold",
+        xaxis_title="Date",
+        yaxis_title="Cumulative Returns",
+        hovermode='x unified',
+        height=400
+    )
+
+    return fig
+
+@st.cache_resource(max_entries=20, show_spinner=False)
+def build_sma_price_fig(_results, symbol, sma_short, sma_long, start, end, fingerprint):
+    """Price and moving averages chart for one SMA run, built once and reused on every rerun"""
+    # Price and moving averages chart
+    fig = go.Figure()
+    points = lttb_xy(_results, ['Close', 'SMA_S', 'SMA_L'])
+
+    fig.add_trace(go.Scattergl(
+        **points['Close'],
+        mode='lines',
+        name='Price',
+        line=dict(color='black', width=1)
+    ))
+
+    fig.add_trace(go.Scattergl(
+        **points['SMA_S'],
+        mode='lines',
+        name=f'SMA {sma_short}',
+        line=dict(color='orange', width=1)
+    ))
+
+    fig.add_trace(go.Scattergl(
+        **points['SMA_L'],
+        mode='lines',
+        name=f'SMA {sma_long}',
+        line=dict(color='green', width=1)
+    ))
+
+    fig.update_layout(
+        title=f"{symbol} - Price and Moving Averages",
+        xaxis_title="Date",
+        yaxis_title="Price ($)",
+        hovermode='x unified',
+        height=400
+    )
+
+    return fig
+
+@st.cache_resource(max_entries=20, show_spinner=False)
+def build_sma_grid_fig(_grid, symbol, start, end, fingerprint):
+    """Strategy return heatmap over the whole moving average grid, built once and reused on every rerun"""
+    # plotly.express is only imported by the charts that use it, so the Home page starts without it
+    import plotly.express as px
+    fig = px.imshow(
+        _grid.to_numpy(),
+        x=[str(long) for long in _grid.columns],
+        y=[str(short) for short in _grid.index],
+        labels=dict(x="Long MA", y="Short MA", color="Strategy Return"),
+        color_continuous_scale='RdYlGn',
+        text_auto='.2f',
+        aspect='auto'
+    )
+    fig.update_layout(title=f"{symbol} - SMA Strategy Return by Moving Average Pair", height=400)
+    return fig
+
+# Same ttl as the stats they're drawn from, keyed on the same download plus a fingerprint of the stats
+@st.cache_resource(ttl=300, max_entries=20, show_spinner=False)
+def build_risk_fig(_summary, symbols, start, end, fingerprint):
+    """Risk vs return scatter for one analysis, built once and reused on every rerun"""
+    import plotly.express as px
+    # Create interactive scatter plot
+    fig = px.scatter(
+        _summary,
+        x='std',
+        y='mean',
+        hover_name=_summary.index,
+        hover_data={'sharpe': ':.3f'},
+        text=_summary.index,
+        title="Risk vs Return Analysis",
+        labels={'std': 'Annual Risk (Standard Deviation)', 'mean': 'Annual Return'}
+    )
+
+    # Label every point from the one trace rather than adding an annotation per ticker
+    fig.update_traces(textposition='top center')
+    fig.update_layout(height=500)
+    return fig
+
+@st.cache_resource(ttl=300, max_entries=20, show_spinner=False)
+def build_corr_fig(_corr_matrix, symbols, start, end, fingerprint):
+    """Correlation heatmap for one analysis, built once and reused on every rerun"""
+    import plotly.express as px
+    # Create interactive heatmap with Plotly - a label per cell is readable (and cheap to draw) up to
+    # about 20 stocks, past that the browser spends its time laying out text nobody can read
+    fig = px.imshow(
+        _corr_matrix,
+        text_auto='.2f' if len(_corr_matrix) <= 20 else False,
+        aspect="auto",
+        color_continuous_scale='RdYlBu_r',
+        title="Stock Correlation Heatmap"
+    )
+
+    fig.update_layout(
+        height=600,
+        xaxis_title="",
+        yaxis_title="",
+    )
+    return fig
+
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_stock_info(symbol):
     """Get basic stock information"""
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        return {
-            'name': info.get('longName', symbol),
-            'sector': info.get('sector', 'N/A'),
-            'industry': info.get('industry', 'N/A'),
-            'market_cap': info.get('marketCap', 'N/A')
-        }
+        # Served from the on-disk symbol table, only symbols we haven't seen this week go to Yahoo
+        return cached_info(symbol)
     except:
         return {'name': symbol, 'sector': 'N/A', 'industry': 'N/A', 'market_cap': 'N/A'}
 
+def get_stocks_info(symbols):
+    """Get basic stock information for a tuple of symbols, the ones we haven't seen this week fetched side by side"""
+    # Not cached here: the on-disk symbol table already answers for everything looked up this week and keeps
+    # failed lookups out, so a network blip only blanks this run's table instead of the next hour's
+    try:
+        return cached_infos(symbols)
+    except Exception:
+        return {symbol: {'name': symbol, 'sector': 'N/A', 'industry': 'N/A', 'market_cap': 'N/A'} for symbol in symbols}
+
+def company_table(symbols):
+    """Company name, sector, industry and market cap of each symbol as one display table"""
+    details = pd.DataFrame.from_dict(get_stocks_info(tuple(symbols)), orient='index')
+    details['market_cap'] = details['market_cap'].map(format_currency)
+    details.columns = ['Company', 'Sector', 'Industry', 'Market Cap']
+    return details
+
 def format_currency(value):
     """Format large numbers as currency"""
-    if isinstance(value, (int, float)) and value >= 1e9:
+    # Anything that isn't a number (e.g. 'N/A') is shown as it is
+    if not isinstance(value, (int, float)):
+        return str(value)
+    if value >= 1e9:
         return f"${value/1e9:.2f}B"
-    elif isinstance(value, (int, float)) and value >= 1e6:
+    if value >= 1e6:
         return f"${value/1e6:.2f}M"
-    elif isinstance(value, (int, float)):
-        return f"${value:,.2f}"
+    return f"${value:,.2f}"
+
+def extract_close_prices(raw_data, symbols):
+    """Adj Close (or Close) prices with one column per symbol, whichever column layout yfinance returned"""
+    columns = raw_data.columns
+    if isinstance(columns, pd.MultiIndex):
+        # Each level's unique labels as a hashed Index, with labels no column uses any more
+        # (left behind by slicing) dropped first so xs never looks up a field that isn't there
+        for level, values in enumerate(columns.remove_unused_levels().levels[:2]):
+            for field in ('Adj Close', 'Close'):
+                if field in values:
+                    return raw_data.xs(field, level=level, axis=1)
+        return None
+    # Flat columns are either the symbols themselves or a single symbol's price fields
+    found = [symbol for symbol in symbols if symbol in columns]
+    if found:
+        return raw_data[found]
+    for field in ('Adj Close', 'Close'):
+        if field in columns:
+            return raw_data[[field]].set_axis(list(symbols)[:1], axis=1)
+    return None
+
+def latest_changes(prices):
+    """Latest price, change and % change of every column at once, skipping gaps the way dropna would"""
+    values = prices.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    rows = np.arange(len(values))[:, None]
+    # Row of each column's last real price, then of the real price before it (-1 if there isn't one)
+    last = np.where(valid, rows, -1).max(axis=0, initial=-1)
+    prev = np.where(valid & (rows < last), rows, -1).max(axis=0, initial=-1)
+    cols = np.arange(values.shape[1])
+    current = values[last, cols]
+    change = current - values[prev, cols]
+    change_pct = change / values[prev, cols] * 100
+    # None marks symbols without two prices to compare
+    return {symbol: (price, diff, pct) if ok else None
+            for symbol, price, diff, pct, ok in zip(prices.columns, current, change, change_pct, prev >= 0)}
+
+# Same ttl as download_chunk, so the stats never outlive the prices they came from.
+# The leading underscore keeps the prices out of the cache key, the download's inputs identify them already
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def risk_summary(_stocks, symbols, start, end):
+    """Annual return, risk and Sharpe ratio of every stock, worked out once per download"""
+    # One contiguous row of prices per stock, and the days where every stock has a return
+    # (the same rows pct_change().dropna() would keep)
+    prices = np.ascontiguousarray(_stocks.to_numpy(dtype=np.float32).T)
+    missing = np.isnan(prices).any(axis=0)
+    keep = ~(missing[1:] | missing[:-1])
+
+    # Annualised mean and std of the daily returns for every stock in one fused pass
+    mean, std = annual_stats(prices, keep)
+    summary = pd.DataFrame({"mean": mean, "std": std}, index=_stocks.columns)
+
+    # Calculate Sharpe ratio with risk-free rate of 0 (can be adjusted)
+    # Handle division by zero for very low volatility stocks
+    summary["sharpe"] = np.where(summary["std"] > 0, summary["mean"] / summary["std"], 0)
+    return summary
+
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def correlation_matrix(_stocks, symbols, start, end):
+    """Correlation of every pair of stocks' daily returns, worked out once per download"""
+    # Returns rather than prices - prices all trend over time, so they look correlated even when the day-to-day
+    # moves aren't (a return is NaN if either of its days is missing)
+    prices = _stocks.to_numpy(dtype=np.float32)
+    returns = prices[1:] / prices[:-1] - 1
+    # With no gaps it's a single float32 matrix product of the standardised returns,
+    # otherwise each pair is worked out over its shared days in a Numba pass
+    if np.isnan(returns).any():
+        corr = pairwise_corr(np.ascontiguousarray(returns.T))
+        return pd.DataFrame(corr, index=_stocks.columns, columns=_stocks.columns)
+    returns -= returns.mean(axis=0)
+    returns /= returns.std(axis=0, ddof=1)
+    corr = returns.T @ returns / (len(returns) - 1)
+    np.clip(corr, -1, 1, out=corr)
+    np.fill_diagonal(corr, 1)
+    # Kept as float32 either way - every later pass over the matrix (the threshold mask, the top pairs, the
+    # heatmap) reads half the bytes, and to_numpy() hands those passes the same buffer without a copy
+    return pd.DataFrame(corr, index=_stocks.columns, columns=_stocks.columns)
+
+def lttb_indices(values, n_out=500):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps when cutting values down to n_out points"""
+    n = len(values)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    if MinMaxLTTBDownsampler is not None:
+        return MinMaxLTTBDownsampler().downsample(np.ascontiguousarray(values), n_out=n_out)
+    y = np.asarray(values, dtype=float)
+    # First and last points are always kept, everything in between is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # The next bucket's average (or the last point) is the triangle's third corner
+        next_hi = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = (hi + next_hi - 1) / 2
+        avg_y = y[hi:next_hi].mean()
+        # Keep the point in this bucket making the biggest triangle with the last kept point and that average
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - np.arange(lo, hi)) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+def lttb_xy(frame, columns, n_out=500):
+    """Downsampled x/y for each column's Plotly trace, so long histories don't ship every daily point to the browser"""
+    # Every trace keeps the same dates (each column's own picks pooled together), so a unified hover lines
+    # them all up and crossovers between the lines stay where they really are
+    values = {column: frame[column].to_numpy() for column in columns}
+    idx = np.unique(np.concatenate([lttb_indices(v, n_out) for v in values.values()]))
+    x = frame.index[idx]
+    return {column: {'x': x, 'y': v[idx]} for column, v in values.items()}
+
+def diversification_scan(corr_matrix, threshold, k=5):
+    """Each stock's low correlation count, the detailed low correlation table and the k most correlated pairs"""
+    # One Numba pass over the matrix does the counts, the first few partners and the top k pairs
+    # (a stock's correlation with itself never counts, and NaN pairs are skipped)
+    # pandas keeps a frame's values column-major, so the kernel's row-by-row walk reads the transpose instead -
+    # the matrix is symmetric, so that's the same numbers in stride-1 order without a copy
+    values = corr_matrix.to_numpy()
+    if not values.flags.c_contiguous:
+        values = np.ascontiguousarray(values.T)
+    counts, partners, top_rows, top_cols, top_vals = corr_scan(values, threshold, k, 5)
+    tickers = corr_matrix.index.to_numpy()
+    low_corr_counts = pd.Series(counts, index=corr_matrix.index)
+    # Most low correlations first, ties left in ticker order, so the table is put together already sorted
+    order = np.argsort(-counts, kind='stable')
+    names = [', '.join(tickers[row[row >= 0]]) + ('...' if count > 5 else '')
+             for row, count in zip(partners[order], counts[order])]
+    summary = pd.DataFrame({
+        'Stock': tickers[order],
+        'Low Correlations Count': counts[order],
+        'Low Correlation Partners': names
+    }, index=order)
+    high_corr_pairs = list(zip(tickers[top_rows], tickers[top_cols], top_vals))
+    return low_corr_counts, summary, high_corr_pairs
+
+def show_backtest_results(stock_info, results, perf, outperf):
+    """Stock information, performance metrics and verdict for a finished Weinstein or SMA backtest"""
+    # Display stock info
+    st.markdown("### Stock Information")
+    info_col1, info_col2 = st.columns(2)
+    with info_col1:
+        st.write(f"**Company:** {stock_info['name']}")
+        st.write(f"**Sector:** {stock_info['sector']}")
+    with info_col2:
+        st.write(f"**Industry:** {stock_info['industry']}")
+        st.write(f"**Market Cap:** {format_currency(stock_info['market_cap'])}")
+
+    # Display results
+    st.markdown("### Strategy Performance")
+    metric_col1, metric_col2, metric_col3 = st.columns(3)
+
+    with metric_col1:
+        buy_hold_return = results['returnsB&H'].iloc[-1]
+        st.metric("Buy & Hold Return", f"{buy_hold_return:.2%}", f"{buy_hold_return-1:.2%}")
+
+    with metric_col2:
+        st.metric("Strategy Return", f"{perf:.2%}", f"{perf-1:.2%}")
+
+    with metric_col3:
+        color = "normal" if outperf >= 0 else "inverse"
+        st.metric("Outperformance", f"{outperf:.2%}", f"{outperf:.2%}", delta_color=color)
+
+    # Success/failure indicator
+    if outperf > 0:
+        st.success(f"Strategy outperformed buy & hold by {outperf:.2%}!")
     else:
-        return str(value)
+        st.warning(f"Strategy underperformed buy & hold by {abs(outperf):.2%}")
+
+def recent_signals(results, columns):
+    """The last 10 days of a backtest's prices/averages (rounded for display) and the position held on each"""
+    recent = results.iloc[-10:]
+    table = {column: recent[column].to_numpy().round(2) for column in columns}
+    table['Signal'] = np.where(recent['position'].to_numpy() > 0, 'Long', 'Short')
+    return pd.DataFrame(table, index=recent.index)
+
+def bump_market_refresh():
+    """Refresh button callback: move the overview onto a new download cache key"""
+    st.session_state['market_refresh'] = st.session_state.get('market_refresh', 0) + 1
+
+# The overview is a fragment so its Refresh button redraws just the table and not the rest of the page
+@st.fragment
+def market_overview(major_indices):
+    """Quick Market Overview table of each symbol's latest price and move"""
+    try:
+        with st.spinner("Loading market data..."):
+            # Download current and previous day data with more robust handling
+            # The refresh count is part of the cache key, so Refresh gets fresh quotes instead of the cached ones
+            raw_data = download_prices(tuple(sorted(major_indices)), period="5d", interval="1d",
+                                       refresh=st.session_state.get('market_refresh', 0))
+            
+            if raw_data.empty:
+                st.warning("Unable to fetch market data at this time")
+            else:
+                # Handle different data structures from yfinance more robustly
+                symbol_data_dict = {}
+                
+                try:
+                    # Slice the price field out once and line it up with the requested symbols in one reindex
+                    closes = extract_close_prices(raw_data, major_indices)
+                    if closes is None:
+                        closes = pd.DataFrame(index=raw_data.index)
+                    closes = closes.reindex(columns=major_indices)
+                    
+                    # Symbols yfinance couldn't find come back (or reindex in) as all-NaN columns
+                    has_data = closes.notna().any().to_numpy()
+                    symbol_data_dict = {symbol: closes[symbol] for symbol in closes.columns[has_data]}
+                    
+                    # If we still don't have data, log the structure for debugging
+                    if not symbol_data_dict:
+                        st.error(f"Could not extract price data. Data structure:")
+                        st.error(f"Columns: {list(raw_data.columns)}")
+                        st.error(f"MultiIndex: {isinstance(raw_data.columns, pd.MultiIndex)}")
+                        if isinstance(raw_data.columns, pd.MultiIndex):
+                            st.error(f"Level 0: {raw_data.columns.get_level_values(0).unique().tolist()}")
+                            st.error(f"Level 1: {raw_data.columns.get_level_values(1).unique().tolist()}")
+                        
+                except Exception as e:
+                    st.error(f"Error processing market data: {str(e)}")
+                    st.error(f"Raw data columns: {list(raw_data.columns)}")
+                    st.error(f"Requested symbols: {major_indices}")
+                
+                # Work out every symbol's latest move in one go
+                quotes = latest_changes(pd.DataFrame(symbol_data_dict)) if symbol_data_dict else {}
+                
+                # One table for all symbols (a single element for the browser to render, not a card each)
+                rows = []
+                for symbol in major_indices:
+                    if symbol not in quotes:
+                        rows.append((symbol, np.nan, np.nan, np.nan, "Symbol not found"))
+                    elif quotes[symbol] is None:
+                        rows.append((symbol, np.nan, np.nan, np.nan, "Insufficient data"))
+                    else:
+                        rows.append((symbol, *quotes[symbol], ""))
+                overview = pd.DataFrame(rows, columns=['Symbol', 'Price', 'Change', 'Change%', 'Status'])
+                if not overview['Status'].any():
+                    overview = overview.drop(columns='Status')
+                
+                # Same green/red as the metric cards
+                def color_change(val):
+                    if pd.isna(val):
+                        return ''
+                    if val >= 0:
+                        return 'background-color: #d4edda; color: #155724; font-weight: bold;'
+                    return 'background-color: #f8d7da; color: #721c24; font-weight: bold;'
+                
+                styled_overview = overview.style.map(color_change, subset=['Change', 'Change%']).format(
+                    {'Price': '${:.2f}', 'Change': '{:+.2f}', 'Change%': '{:+.2f}%'}, na_rep='N/A')
+                st.dataframe(styled_overview, hide_index=True, use_container_width=True)
+                
+                # Add refresh button and info
+                st.markdown("---")
+                col_info, col_refresh = st.columns([3, 1])
+                with col_info:
+                    st.caption(f"Showing {len(major_indices)} stocks • Data from last 5 trading days")
+                with col_refresh:
+                    # A click inside the fragment reruns just the overview, not the whole page,
+                    # and bumps the refresh count first so that rerun downloads again
+                    st.button("Refresh", key="refresh_market_data", on_click=bump_market_refresh)
+                        
+    except Exception as e:
+        st.error(f"Error loading market data: {str(e)}")
+        st.info("Market data temporarily unavailable - please try refreshing the page")
 
 # HOME PAGE
 if page == "Home":
@@ -192,143 +743,7 @@ if page == "Home":
         if len(major_indices) == 0:
             major_indices = default_overview_stocks
     
-    try:
-        with st.spinner("Loading market data..."):
-            # Download current and previous day data with more robust handling
-            raw_data = yf.download(major_indices, period="5d", interval="1d")
-            
-            if raw_data.empty:
-                st.warning("Unable to fetch market data at this time")
-            else:
-                # Create responsive columns based on number of stocks
-                cols = st.columns(len(major_indices))
-                
-                # Handle different data structures from yfinance more robustly
-                symbol_data_dict = {}
-                
-                try:
-                    if len(major_indices) == 1:
-                        # Single symbol case
-                        symbol = major_indices[0]
-                        if isinstance(raw_data.columns, pd.MultiIndex):
-                            # MultiIndex case for single symbol
-                            if 'Adj Close' in raw_data.columns.get_level_values(1):
-                                symbol_data_dict[symbol] = raw_data[('Adj Close', symbol)] if (('Adj Close', symbol)) in raw_data.columns else raw_data.xs('Adj Close', level=1, axis=1).iloc[:, 0]
-                            elif 'Close' in raw_data.columns.get_level_values(1):
-                                symbol_data_dict[symbol] = raw_data[('Close', symbol)] if (('Close', symbol)) in raw_data.columns else raw_data.xs('Close', level=1, axis=1).iloc[:, 0]
-                        else:
-                            # Flat columns for single symbol
-                            if 'Adj Close' in raw_data.columns:
-                                symbol_data_dict[symbol] = raw_data['Adj Close']
-                            elif 'Close' in raw_data.columns:
-                                symbol_data_dict[symbol] = raw_data['Close']
-                            elif symbol in raw_data.columns:
-                                # Symbol name is the column (yfinance sometimes returns this way)
-                                symbol_data_dict[symbol] = raw_data[symbol]
-                    else:
-                        # Multiple symbols case
-                        if isinstance(raw_data.columns, pd.MultiIndex):
-                            # MultiIndex case (metric, symbol) or (symbol, metric)
-                            level_0_values = raw_data.columns.get_level_values(0).unique()
-                            level_1_values = raw_data.columns.get_level_values(1).unique()
-                            
-                            # Check if level 0 contains price columns or symbols
-                            if 'Adj Close' in level_0_values:
-                                # Format: (metric, symbol)
-                                for symbol in major_indices:
-                                    if ('Adj Close', symbol) in raw_data.columns:
-                                        symbol_data_dict[symbol] = raw_data[('Adj Close', symbol)]
-                            elif 'Close' in level_0_values:
-                                # Format: (metric, symbol)
-                                for symbol in major_indices:
-                                    if ('Close', symbol) in raw_data.columns:
-                                        symbol_data_dict[symbol] = raw_data[('Close', symbol)]
-                            elif 'Adj Close' in level_1_values:
-                                # Format: (symbol, metric)
-                                for symbol in major_indices:
-                                    if (symbol, 'Adj Close') in raw_data.columns:
-                                        symbol_data_dict[symbol] = raw_data[(symbol, 'Adj Close')]
-                            elif 'Close' in level_1_values:
-                                # Format: (symbol, metric)
-                                for symbol in major_indices:
-                                    if (symbol, 'Close') in raw_data.columns:
-                                        symbol_data_dict[symbol] = raw_data[(symbol, 'Close')]
-                        else:
-                            # Flat columns case - symbols are column names
-                            for symbol in major_indices:
-                                if symbol in raw_data.columns:
-                                    symbol_data_dict[symbol] = raw_data[symbol]
-                    
-                    # If we still don't have data, log the structure for debugging
-                    if not symbol_data_dict:
-                        st.error(f"Could not extract price data. Data structure:")
-                        st.error(f"Columns: {list(raw_data.columns)}")
-                        st.error(f"MultiIndex: {isinstance(raw_data.columns, pd.MultiIndex)}")
-                        if isinstance(raw_data.columns, pd.MultiIndex):
-                            st.error(f"Level 0: {raw_data.columns.get_level_values(0).unique().tolist()}")
-                            st.error(f"Level 1: {raw_data.columns.get_level_values(1).unique().tolist()}")
-                        
-                except Exception as e:
-                    st.error(f"Error processing market data: {str(e)}")
-                    st.error(f"Raw data columns: {list(raw_data.columns)}")
-                    st.error(f"Requested symbols: {major_indices}")
-                
-                # Display data for each symbol
-                for i, symbol in enumerate(major_indices):
-                    with cols[i]:
-                        try:
-                            if symbol in symbol_data_dict:
-                                symbol_data = symbol_data_dict[symbol].dropna()
-                                
-                                if len(symbol_data) >= 2:
-                                    current_price = symbol_data.iloc[-1]
-                                    prev_price = symbol_data.iloc[-2]
-                                    change = current_price - prev_price
-                                    change_pct = (change / prev_price) * 100
-                                    
-                                    color = "success-metric" if change >= 0 else "danger-metric"
-                                    st.markdown(f"""
-                                    <div class="metric-card {color}">
-                                        <h4>{symbol}</h4>
-                                        <p><strong>${current_price:.2f}</strong></p>
-                                        <p>{change:+.2f} ({change_pct:+.2f}%)</p>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                else:
-                                    st.markdown(f"""
-                                    <div class="metric-card">
-                                        <h4>{symbol}</h4>
-                                        <p><strong>Insufficient data</strong></p>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"""
-                                <div class="metric-card">
-                                    <h4>{symbol}</h4>
-                                    <p><strong>Symbol not found</strong></p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                        except Exception as symbol_error:
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h4>{symbol}</h4>
-                                <p><strong>Data unavailable</strong></p>
-                                <p><small>{str(symbol_error)}</small></p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                
-                # Add refresh button and info
-                st.markdown("---")
-                col_info, col_refresh = st.columns([3, 1])
-                with col_info:
-                    st.caption(f"Showing {len(major_indices)} stocks • Data from last 5 trading days")
-                with col_refresh:
-                    if st.button("Refresh", key="refresh_market_data"):
-                        st.rerun()
-                        
-    except Exception as e:
-        st.error(f"Error loading market data: {str(e)}")
-        st.info("Market data temporarily unavailable - please try refreshing the page")
+    market_overview(major_indices)
 
 # STAN WEINSTEIN STRATEGY PAGE
 elif page == "Stan Weinstein Strategy":
@@ -356,47 +771,23 @@ elif page == "Stan Weinstein Strategy":
             if symbol and start_date < end_date:
                 with st.spinner("Analyzing strategy performance..."):
                     try:
-                        # Get stock info
-                        stock_info = get_stock_info(symbol)
-                        
-                        # Run the analysis
-                        tester = StanWeinsteinTester(symbol, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-                        perf, outperf = tester.test_results()
-                        
-                        # Display stock info
-                        st.markdown("### Stock Information")
-                        info_col1, info_col2 = st.columns(2)
-                        with info_col1:
-                            st.write(f"**Company:** {stock_info['name']}")
-                            st.write(f"**Sector:** {stock_info['sector']}")
-                        with info_col2:
-                            st.write(f"**Industry:** {stock_info['industry']}")
-                            st.write(f"**Market Cap:** {format_currency(stock_info['market_cap'])}")
-                        
-                        # Display results
-                        st.markdown("### Strategy Performance")
-                        metric_col1, metric_col2, metric_col3 = st.columns(3)
-                        
-                        with metric_col1:
-                            buy_hold_return = tester.results['returnsB&H'].iloc[-1]
-                            st.metric("Buy & Hold Return", f"{buy_hold_return:.2%}", f"{buy_hold_return-1:.2%}")
-                        
-                        with metric_col2:
-                            st.metric("Strategy Return", f"{perf:.2%}", f"{perf-1:.2%}")
-                        
-                        with metric_col3:
-                            color = "normal" if outperf >= 0 else "inverse"
-                            st.metric("Outperformance", f"{outperf:.2%}", f"{outperf:.2%}", delta_color=color)
+                        # Fetch the stock info in the background while the analysis downloads its prices
+                        with ThreadPoolExecutor(max_workers=1) as pool:
+                            info_future = pool.submit(get_stock_info, symbol)
+                            
+                            # Run the analysis
+                            results, perf, outperf = run_weinstein(symbol, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                            
+                            stock_info = info_future.result()
                         
-                        # Success/failure indicator
-                        if outperf > 0:
-                            st.success(f"Strategy outperformed buy & hold by {outperf:.2%}!")
-                        else:
-                            st.warning(f"Strategy underperformed buy & hold by {abs(outperf):.2%}")
+                        show_backtest_results(stock_info, results, perf, outperf)
                         
                         # Store results in session state for plotting
-                        st.session_state['weinstein_results'] = tester.results
+                        st.session_state['weinstein_results'] = results
                         st.session_state['weinstein_symbol'] = symbol
+                        st.session_state['weinstein_dates'] = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                        # The recent signals table only changes with the run, so build it here rather than on every rerun
+                        st.session_state['weinstein_signals'] = recent_signals(results, ['Close', 'SMA_30'])
                         
                     except Exception as e:
                         st.error(f"Error running analysis: {str(e)}")
@@ -409,44 +800,14 @@ elif page == "Stan Weinstein Strategy":
         if 'weinstein_results' in st.session_state:
             results = st.session_state['weinstein_results']
             symbol = st.session_state['weinstein_symbol']
+            weinstein_start, weinstein_end = st.session_state['weinstein_dates']
             
-            # Create interactive plot with Plotly
-            fig = go.Figure()
-            
-            fig.add_trace(go.Scatter(
-                x=results.index,
-                y=results['returnsB&H'],
-                mode='lines',
-                name='Buy & Hold',
-                line=dict(color='blue', width=2)
-            ))
-            
-            fig.add_trace(go.Scatter(
-                x=results.index,
-                y=results['returnstrategy'],
-                mode='lines',
-                name='Weinstein Strategy',
-                line=dict(color='red', width=2)
-            ))
-            
-            fig.update_layout(
-                title=f"{symbol} - Stan Weinstein Strategy vs Buy & Hold",
-                xaxis_title="Date",
-                yaxis_title="Cumulative Returns",
-                hovermode='x unified',
-                height=500
-            )
-            
+            fig = build_weinstein_fig(results, symbol, weinstein_start, weinstein_end, frame_fingerprint(results))
             st.plotly_chart(fig, use_container_width=True)
             
             # Show recent signals
             st.markdown("### Recent Trading Signals")
-            recent_signals = results.tail(10)[['Close', 'SMA_30', 'position']].copy()
-            recent_signals['Signal'] = recent_signals['position'].map({1: 'Long', -1: 'Short'})
-            recent_signals['Close'] = recent_signals['Close'].round(2)
-            recent_signals['SMA_30'] = recent_signals['SMA_30'].round(2)
-            recent_signals = recent_signals[['Close', 'SMA_30', 'Signal']]
-            st.dataframe(recent_signals, use_container_width=True)
+            st.dataframe(st.session_state['weinstein_signals'], use_container_width=True)
         else:
             st.info("Run an analysis to see the performance chart and trading signals")
 
@@ -485,49 +846,25 @@ elif page == "SMA Backtesting":
             if symbol and start_date < end_date and sma_short < sma_long:
                 with st.spinner("Analyzing SMA crossover strategy..."):
                     try:
-                        # Get stock info
-                        stock_info = get_stock_info(symbol)
-                        
-                        # Run the analysis
-                        tester = SMABacktester(symbol, sma_short, sma_long, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-                        perf, outperf = tester.test_results()
-                        
-                        # Display stock info
-                        st.markdown("### Stock Information")
-                        info_col1, info_col2 = st.columns(2)
-                        with info_col1:
-                            st.write(f"**Company:** {stock_info['name']}")
-                            st.write(f"**Sector:** {stock_info['sector']}")
-                        with info_col2:
-                            st.write(f"**Industry:** {stock_info['industry']}")
-                            st.write(f"**Market Cap:** {format_currency(stock_info['market_cap'])}")
-                        
-                        # Display results
-                        st.markdown("### Strategy Performance")
-                        metric_col1, metric_col2, metric_col3 = st.columns(3)
-                        
-                        with metric_col1:
-                            buy_hold_return = tester.results['returnsB&H'].iloc[-1]
-                            st.metric("Buy & Hold Return", f"{buy_hold_return:.2%}", f"{buy_hold_return-1:.2%}")
-                        
-                        with metric_col2:
-                            st.metric("Strategy Return", f"{perf:.2%}", f"{perf-1:.2%}")
-                        
-                        with metric_col3:
-                            color = "normal" if outperf >= 0 else "inverse"
-                            st.metric("Outperformance", f"{outperf:.2%}", f"{outperf:.2%}", delta_color=color)
+                        # Fetch the stock info in the background while the analysis downloads its prices
+                        with ThreadPoolExecutor(max_workers=1) as pool:
+                            info_future = pool.submit(get_stock_info, symbol)
+                            
+                            # Run the analysis
+                            results, perf, outperf = run_sma(symbol, sma_short, sma_long, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                            
+                            stock_info = info_future.result()
                         
-                        # Success/failure indicator
-                        if outperf > 0:
-                            st.success(f"Strategy outperformed buy & hold by {outperf:.2%}!")
-                        else:
-                            st.warning(f"Strategy underperformed buy & hold by {abs(outperf):.2%}")
+                        show_backtest_results(stock_info, results, perf, outperf)
                         
                         # Store results in session state for plotting
-                        st.session_state['sma_results'] = tester.results
+                        st.session_state['sma_results'] = results
                         st.session_state['sma_symbol'] = symbol
                         st.session_state['sma_short'] = sma_short
                         st.session_state['sma_long'] = sma_long
+                        st.session_state['sma_dates'] = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                        # The recent signals table only changes with the run, so build it here rather than on every rerun
+                        st.session_state['sma_signals'] = recent_signals(results, ['Close', 'SMA_S', 'SMA_L'])
                         
                     except Exception as e:
                         st.error(f"Error running analysis: {str(e)}")
@@ -542,87 +879,34 @@ elif page == "SMA Backtesting":
             symbol = st.session_state['sma_symbol']
             sma_short = st.session_state['sma_short']
             sma_long = st.session_state['sma_long']
+            sma_start, sma_end = st.session_state['sma_dates']
             
             # Create tabs for different views
-            tab1, tab2 = st.tabs(["Returns Comparison", "Price & Moving Averages"])
+            tab1, tab2, tab3 = st.tabs(["Returns Comparison", "Price & Moving Averages", "Grid Search"])
             
             with tab1:
-                # Performance comparison chart
-                fig = go.Figure()
-                
-                fig.add_trace(go.Scatter(
-                    x=results.index,
-                    y=results['returnsB&H'],
-                    mode='lines',
-                    name='Buy & Hold',
-                    line=dict(color='blue', width=2)
-                ))
-                
-                fig.add_trace(go.Scatter(
-                    x=results.index,
-                    y=results['returnstrategy'],
-                    mode='lines',
-                    name=f'SMA Strategy ({sma_short}/{sma_long})',
-                    line=dict(color='red', width=2)
-                ))
-                
-                fig.update_layout(
-                    title=f"{symbol} - SMA Strategy vs Buy & Hold",
-                    xaxis_title="Date",
-                    yaxis_title="Cumulative Returns",
-                    hovermode='x unified',
-                    height=400
-                )
-                
+                fig = build_sma_returns_fig(results, symbol, sma_short, sma_long, sma_start, sma_end,
+                                            frame_fingerprint(results))
                 st.plotly_chart(fig, use_container_width=True)
             
             with tab2:
-                # Price and moving averages chart
-                fig2 = go.Figure()
-                
-                fig2.add_trace(go.Scatter(
-                    x=results.index,
-                    y=results['Close'],
-                    mode='lines',
-                    name='Price',
-                    line=dict(color='black', width=1)
-                ))
-                
-                fig2.add_trace(go.Scatter(
-                    x=results.index,
-                    y=results['SMA_S'],
-                    mode='lines',
-                    name=f'SMA {sma_short}',
-                    line=dict(color='orange', width=1)
-                ))
-                
-                fig2.add_trace(go.Scatter(
-                    x=results.index,
-                    y=results['SMA_L'],
-                    mode='lines',
-                    name=f'SMA {sma_long}',
-                    line=dict(color='green', width=1)
-                ))
-                
-                fig2.update_layout(
-                    title=f"{symbol} - Price and Moving Averages",
-                    xaxis_title="Date",
-                    yaxis_title="Price ($)",
-                    hovermode='x unified',
-                    height=400
-                )
-                
+                fig2 = build_sma_price_fig(results, symbol, sma_short, sma_long, sma_start, sma_end,
+                                           frame_fingerprint(results))
                 st.plotly_chart(fig2, use_container_width=True)
             
+            with tab3:
+                # Strategy return for every short/long pair, the same grid whichever windows were picked
+                try:
+                    grid = run_sma_grid(symbol, sma_start, sma_end)
+                    fig3 = build_sma_grid_fig(grid, symbol, sma_start, sma_end, frame_fingerprint(grid))
+                    st.plotly_chart(fig3, use_container_width=True)
+                    st.caption("Cumulative strategy return (1.00 = break even) for each pair; blank cells have short ≥ long or too little history")
+                except Exception as e:
+                    st.error(f"Error running grid search: {str(e)}")
+            
             # Show recent signals
             st.markdown("### Recent Trading Signals")
-            recent_signals = results.tail(10)[['Close', 'SMA_S', 'SMA_L', 'position']].copy()
-            recent_signals['Signal'] = recent_signals['position'].map({1: 'Long', -1: 'Short'})
-            recent_signals['Close'] = recent_signals['Close'].round(2)
-            recent_signals['SMA_S'] = recent_signals['SMA_S'].round(2)
-            recent_signals['SMA_L'] = recent_signals['SMA_L'].round(2)
-            recent_signals = recent_signals[['Close', 'SMA_S', 'SMA_L', 'Signal']]
-            st.dataframe(recent_signals, use_container_width=True)
+            st.dataframe(st.session_state['sma_signals'], use_container_width=True)
         else:
             st.info("Run an analysis to see the performance charts and trading signals")
 
@@ -666,57 +950,19 @@ elif page == "Risk vs Reward":
             else:
                 with st.spinner("Downloading data and calculating metrics..."):
                     try:
-                        # Download stock data with more robust error handling
-                        raw_data = yf.download(stock_list, start=start_date.strftime('%Y-%m-%d'), end=end_date.strftime('%Y-%m-%d'))
+                        # Download stock data - the same sorted key on both analysis pages, so they share one cached download
+                        price_key = (tuple(sorted(stock_list)), start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                        raw_data = download_prices(*price_key)
                         
                         if raw_data.empty:
                             st.error("No data found for the specified stocks and date range")
                             st.stop()
                         
-                        # Handle different data structures from yfinance
-                        try:
-                            # Try to get Adj Close first, then Close
-                            if isinstance(raw_data.columns, pd.MultiIndex):
-                                # Multiple stocks with MultiIndex columns
-                                level_0_values = raw_data.columns.get_level_values(0).unique()
-                                level_1_values = raw_data.columns.get_level_values(1).unique()
-                                
-                                # Check if level 0 contains price columns or symbols
-                                if 'Adj Close' in level_0_values:
-                                    # Format: (metric, symbol) - extract Adj Close data
-                                    stocks = raw_data.xs('Adj Close', level=0, axis=1)
-                                elif 'Close' in level_0_values:
-                                    # Format: (metric, symbol) - extract Close data
-                                    stocks = raw_data.xs('Close', level=0, axis=1)
-                                elif 'Adj Close' in level_1_values:
-                                    # Format: (symbol, metric) - extract Adj Close data
-                                    stocks = raw_data.xs('Adj Close', level=1, axis=1)
-                                elif 'Close' in level_1_values:
-                                    # Format: (symbol, metric) - extract Close data
-                                    stocks = raw_data.xs('Close', level=1, axis=1)
-                                else:
-                                    st.error(f"No price columns found. Level 0: {list(level_0_values)}, Level 1: {list(level_1_values)}")
-                                    st.stop()
-                            else:
-                                # Flat columns - check if columns are stock symbols first
-                                symbols_found = [symbol for symbol in stock_list if symbol in raw_data.columns]
-                                st.info(f"Symbols found in columns: {symbols_found}")
-                                if len(symbols_found) > 0:
-                                    # Columns are symbol names, data is the adjusted close
-                                    stocks = raw_data[symbols_found]
-                                    st.success(f"Using {len(symbols_found)} symbols as column names")
-                                elif 'Adj Close' in raw_data.columns:
-                                    stocks = raw_data[['Adj Close']]
-                                    stocks.columns = stock_list
-                                elif 'Close' in raw_data.columns:
-                                    stocks = raw_data[['Close']]
-                                    stocks.columns = stock_list
-                                else:
-                                    st.error(f"No price columns found. Available columns: {list(raw_data.columns)}")
-                                    st.error(f"Expected symbols: {stock_list}")
-                                    st.stop()
-                        except Exception as e:
-                            st.error(f"Error processing data structure: {str(e)}")
+                        # Adj Close (or Close) for each stock, whichever layout yfinance returned
+                        stocks = extract_close_prices(raw_data, stock_list)
+                        if stocks is None:
+                            st.error(f"No price columns found. Available columns: {list(raw_data.columns)}")
+                            st.error(f"Expected symbols: {stock_list}")
                             st.stop()
                         
                         # Remove any NaN columns/stocks
@@ -726,22 +972,11 @@ elif page == "Risk vs Reward":
                             st.error("No valid data found for the specified stocks and date range")
                             st.stop()
                         
-                        # Calculate daily returns
-                        returns = stocks.pct_change().dropna()
-                        
-                        # Calculate summary statistics
-                        summary = returns.describe().T.loc[:, ["mean", "std"]]
-                        summary["mean"] = summary["mean"] * 252  # Annualize
-                        summary["std"] = summary["std"] * np.sqrt(252)  # Annualize
-                        
-                        # Calculate Sharpe ratio with risk-free rate of 0 (can be adjusted)
-                        # Handle division by zero for very low volatility stocks
-                        summary["sharpe"] = np.where(summary["std"] > 0, summary["mean"] / summary["std"], 0)
+                        summary = risk_summary(stocks, *price_key)
                         
                         # Store in session state
                         st.session_state['risk_summary'] = summary
-                        st.session_state['risk_stocks'] = stocks
-                        st.session_state['risk_returns'] = returns
+                        st.session_state['risk_key'] = price_key
                         
                         st.success(f"Analysis complete for {len(stock_list)} stocks!")
                         
@@ -754,67 +989,40 @@ elif page == "Risk vs Reward":
         if 'risk_summary' in st.session_state:
             summary = st.session_state['risk_summary']
             
-            # Create interactive scatter plot
-            fig = px.scatter(
-                summary,
-                x='std',
-                y='mean',
-                hover_name=summary.index,
-                hover_data={'sharpe': ':.3f'},
-                title="Risk vs Return Analysis",
-                labels={'std': 'Annual Risk (Standard Deviation)', 'mean': 'Annual Return'}
-            )
-            
-            # Add text annotations
-            for i, ticker in enumerate(summary.index):
-                fig.add_annotation(
-                    x=summary.loc[ticker, 'std'],
-                    y=summary.loc[ticker, 'mean'],
-                    text=ticker,
-                    showarrow=True,
-                    arrowhead=1,
-                    yshift=10
-                )
-            
-            fig.update_layout(height=500)
+            fig = build_risk_fig(summary, *st.session_state['risk_key'], frame_fingerprint(summary))
             st.plotly_chart(fig, use_container_width=True)
             
             # Display summary table
             st.markdown("### Summary Statistics")
-            summary_display = summary.copy()
-            summary_display['mean'] = summary_display['mean'].apply(lambda x: f"{x:.2%}")
-            summary_display['std'] = summary_display['std'].apply(lambda x: f"{x:.2%}")
-            summary_display['sharpe'] = summary_display['sharpe'].apply(lambda x: f"{x:.3f}")
-            summary_display.columns = ['Annual Return', 'Annual Risk', 'Sharpe Ratio']
+            # The numbers stay numeric, the Styler only formats them when the table is drawn
+            summary_display = summary.rename(columns={'mean': 'Annual Return', 'std': 'Annual Risk', 'sharpe': 'Sharpe Ratio'})
             
-            # Color coding based on Sharpe ratio
-            def color_sharpe(val):
-                try:
-                    # Extract numeric value from formatted string
-                    numeric_val = float(val)
-                    if numeric_val > 1:
-                        return 'background-color: #d4edda; color: #155724; font-weight: bold;'  # Green
-                    elif numeric_val > 0.5:
-                        return 'background-color: #fff3cd; color: #856404; font-weight: bold;'  # Yellow
-                    elif numeric_val > 0:
-                        return 'background-color: #f8d7da; color: #721c24; font-weight: bold;'  # Light Red
-                    else:
-                        return 'background-color: #dc3545; color: white; font-weight: bold;'  # Dark Red
-                except:
-                    return ''
+            # Color coding based on Sharpe ratio, bucketed for the whole column at once
+            def color_sharpe(col):
+                sharpe = col.to_numpy(dtype=float)
+                return np.select(
+                    [sharpe > 1, sharpe > 0.5, sharpe > 0],
+                    ['background-color: #d4edda; color: #155724; font-weight: bold;',  # Green
+                     'background-color: #fff3cd; color: #856404; font-weight: bold;',  # Yellow
+                     'background-color: #f8d7da; color: #721c24; font-weight: bold;'],  # Light Red
+                    default='background-color: #dc3545; color: white; font-weight: bold;'  # Dark Red
+                )
             
             # Style the dataframe
-            styled_df = summary_display.style.applymap(color_sharpe, subset=['Sharpe Ratio'])
+            styled_df = summary_display.style.apply(color_sharpe, subset=['Sharpe Ratio'])
             
-            # Add some custom CSS to make the table more readable
+            # Percentages for the return and risk, 3 decimals for the Sharpe ratio
             styled_df = styled_df.format({
-                'Annual Return': lambda x: x,
-                'Annual Risk': lambda x: x,
-                'Sharpe Ratio': lambda x: x
+                'Annual Return': '{:.2%}',
+                'Annual Risk': '{:.2%}',
+                'Sharpe Ratio': '{:.3f}'
             })
             
             st.dataframe(styled_df, use_container_width=True)
             
+            with st.expander("Company Details"):
+                st.dataframe(company_table(summary.index), use_container_width=True)
+            
             # Add interpretation guide
             st.markdown("#### Sharpe Ratio Interpretation")
             col_guide1, col_guide2, col_guide3, col_guide4 = st.columns(4)
@@ -835,31 +1043,34 @@ elif page == "Risk vs Reward":
         # Best/Worst performers
         if 'risk_summary' in st.session_state:
             summary = st.session_state['risk_summary']
+            # Plain arrays and positional picks, skipping NaNs the way idxmax/idxmin do
+            names = summary.index
+            means, stds, sharpes = (summary[col].to_numpy() for col in ('mean', 'std', 'sharpe'))
             
             col_best, col_worst = st.columns(2)
             
             with col_best:
                 st.markdown("### Best Performers")
-                best_return = summary.loc[summary['mean'].idxmax()]
-                best_sharpe = summary.loc[summary['sharpe'].idxmax()]
+                best_return = np.nanargmax(means)
+                best_sharpe = np.nanargmax(sharpes)
                 
-                st.write(f"**Highest Return:** {best_return.name} ({best_return['mean']:.2%})")
-                st.write(f"**Best Sharpe Ratio:** {best_sharpe.name} ({best_sharpe['sharpe']:.3f})")
+                st.write(f"**Highest Return:** {names[best_return]} ({means[best_return]:.2%})")
+                st.write(f"**Best Sharpe Ratio:** {names[best_sharpe]} ({sharpes[best_sharpe]:.3f})")
             
             with col_worst:
                 st.markdown("### Highest Risk")
-                highest_risk = summary.loc[summary['std'].idxmax()]
-                lowest_sharpe = summary.loc[summary['sharpe'].idxmin()]
+                highest_risk = np.nanargmax(stds)
+                lowest_sharpe = np.nanargmin(sharpes)
                 
-                st.write(f"**Highest Risk:** {highest_risk.name} ({highest_risk['std']:.2%})")
-                st.write(f"**Lowest Sharpe:** {lowest_sharpe.name} ({lowest_sharpe['sharpe']:.3f})")
+                st.write(f"**Highest Risk:** {names[highest_risk]} ({stds[highest_risk]:.2%})")
+                st.write(f"**Lowest Sharpe:** {names[lowest_sharpe]} ({sharpes[lowest_sharpe]:.3f})")
 
 # CORRELATION HEATMAP PAGE
 elif page == "Correlation Heatmap":
     st.markdown('<h1 class="main-header">Stock Correlation Analysis</h1>', unsafe_allow_html=True)
     
     st.markdown("""
-    Analyse correlations between different stocks to understand how they move together.
+    Analyse correlations between different stocks' daily returns to understand how they move together.
     High correlations suggest stocks move in similar directions, while low correlations indicate diversification benefits.
     """)
     
@@ -896,54 +1107,18 @@ elif page == "Correlation Heatmap":
             else:
                 with st.spinner("Downloading data and calculating correlations..."):
                     try:
-                        # Download stock data with more robust error handling
-                        raw_data = yf.download(stock_list, start=start_date.strftime('%Y-%m-%d'), end=end_date.strftime('%Y-%m-%d'))
+                        # Download stock data - the same sorted key on both analysis pages, so they share one cached download
+                        price_key = (tuple(sorted(stock_list)), start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                        raw_data = download_prices(*price_key)
                         
                         if raw_data.empty:
                             st.error("No data found for the specified stocks and date range")
                             st.stop()
                         
-                        # Handle different data structures from yfinance
-                        try:
-                            # Try to get Adj Close first, then Close
-                            if isinstance(raw_data.columns, pd.MultiIndex):
-                                # Multiple stocks with MultiIndex columns
-                                level_0_values = raw_data.columns.get_level_values(0).unique()
-                                level_1_values = raw_data.columns.get_level_values(1).unique()
-                                
-                                # Check if level 0 contains price columns or symbols
-                                if 'Adj Close' in level_0_values:
-                                    # Format: (metric, symbol) - extract Adj Close data
-                                    stocks = raw_data.xs('Adj Close', level=0, axis=1)
-                                elif 'Close' in level_0_values:
-                                    # Format: (metric, symbol) - extract Close data
-                                    stocks = raw_data.xs('Close', level=0, axis=1)
-                                elif 'Adj Close' in level_1_values:
-                                    # Format: (symbol, metric) - extract Adj Close data
-                                    stocks = raw_data.xs('Adj Close', level=1, axis=1)
-                                elif 'Close' in level_1_values:
-                                    # Format: (symbol, metric) - extract Close data
-                                    stocks = raw_data.xs('Close', level=1, axis=1)
-                                else:
-                                    st.error(f"No price columns found. Level 0: {list(level_0_values)}, Level 1: {list(level_1_values)}")
-                                    st.stop()
-                            else:
-                                # Flat columns - check if columns are stock symbols
-                                symbols_found = [symbol for symbol in stock_list if symbol in raw_data.columns]
-                                if len(symbols_found) > 0:
-                                    # Columns are symbol names, data is the adjusted close
-                                    stocks = raw_data[symbols_found]
-                                elif 'Adj Close' in raw_data.columns:
-                                    stocks = raw_data[['Adj Close']]
-                                    stocks.columns = stock_list
-                                elif 'Close' in raw_data.columns:
-                                    stocks = raw_data[['Close']]
-                                    stocks.columns = stock_list
-                                else:
-                                    st.error(f"No price columns found. Available columns: {list(raw_data.columns)}")
-                                    st.stop()
-                        except Exception as e:
-                            st.error(f"Error processing data structure: {str(e)}")
+                        # Adj Close (or Close) for each stock, whichever layout yfinance returned
+                        stocks = extract_close_prices(raw_data, stock_list)
+                        if stocks is None:
+                            st.error(f"No price columns found. Available columns: {list(raw_data.columns)}")
                             st.stop()
                         
                         # Remove any NaN columns/stocks
@@ -953,16 +1128,18 @@ elif page == "Correlation Heatmap":
                             st.error("Not enough valid data found for correlation analysis")
                             st.stop()
                         
-                        # Calculate correlation matrix
-                        corr_matrix = stocks.corr()
+                        corr_matrix = correlation_matrix(stocks, *price_key)
                         
-                        # Calculate low correlation counts
-                        low_corr_counts = (np.abs(corr_matrix) < low_corr_threshold).sum(axis=1) - 1
+                        # The counts, detailed table and top pairs only change with the analysis, so they're
+                        # worked out here in one pass rather than on every rerun
+                        low_corr_counts, summary, high_corr_pairs = diversification_scan(corr_matrix, low_corr_threshold)
                         
                         # Store in session state
                         st.session_state['corr_matrix'] = corr_matrix
-                        st.session_state['corr_stocks'] = stocks
+                        st.session_state['corr_key'] = price_key
                         st.session_state['low_corr_counts'] = low_corr_counts
+                        st.session_state['low_corr_summary'] = summary
+                        st.session_state['high_corr_pairs'] = high_corr_pairs
                         st.session_state['low_corr_threshold'] = low_corr_threshold
                         
                         st.success(f"Correlation analysis complete for {len(corr_matrix.columns)} stocks!")
@@ -976,21 +1153,7 @@ elif page == "Correlation Heatmap":
         if 'corr_matrix' in st.session_state:
             corr_matrix = st.session_state['corr_matrix']
             
-            # Create interactive heatmap with Plotly
-            fig = px.imshow(
-                corr_matrix,
-                text_auto=True,
-                aspect="auto",
-                color_continuous_scale='RdYlBu_r',
-                title="Stock Correlation Heatmap"
-            )
-            
-            fig.update_layout(
-                height=600,
-                xaxis_title="",
-                yaxis_title="",
-            )
-            
+            fig = build_corr_fig(corr_matrix, *st.session_state['corr_key'], frame_fingerprint(corr_matrix))
             st.plotly_chart(fig, use_container_width=True)
             
         else:
@@ -998,6 +1161,7 @@ elif page == "Correlation Heatmap":
     
     # Low correlation analysis
     if 'corr_matrix' in st.session_state:
+        corr_matrix = st.session_state['corr_matrix']
         st.markdown("### Diversification Analysis")
         
         col_div1, col_div2 = st.columns(2)
@@ -1010,46 +1174,26 @@ elif page == "Correlation Heatmap":
             # Sort by most low correlations
             best_diversifiers = low_corr_counts.sort_values(ascending=False).head(5)
             
-            for ticker, count in best_diversifiers.items():
-                st.write(f"**{ticker}:** {count} low correlations (< {threshold})")
+            # One markdown element for all of them rather than one per stock
+            st.markdown("\n\n".join(f"**{ticker}:** {count} low correlations (< {threshold})"
+                                      for ticker, count in best_diversifiers.items()))
         
         with col_div2:
             st.markdown("#### Highest Correlations")
-            corr_matrix = st.session_state['corr_matrix']
-            
-            # Find highest correlations (excluding self-correlations)
-            mask = np.triu(np.ones_like(corr_matrix), k=1).astype(bool)
-            high_corr = corr_matrix.where(mask).stack().sort_values(ascending=False).head(5)
             
-            for (stock1, stock2), corr_val in high_corr.items():
-                st.write(f"**{stock1} - {stock2}:** {corr_val:.3f}")
+            # One markdown element for all the pairs rather than one per pair
+            st.markdown("\n\n".join(f"**{stock1} - {stock2}:** {corr_val:.3f}"
+                                      for stock1, stock2, corr_val in st.session_state['high_corr_pairs']))
         
         # Detailed correlation table
         st.markdown("### Detailed Correlation Analysis")
         
-        # Create a summary of low correlations for each stock
-        threshold = st.session_state['low_corr_threshold']
-        summary_data = []
+        # Summary of low correlations for each stock, built with the analysis
+        st.dataframe(st.session_state['low_corr_summary'], use_container_width=True)
         
-        for ticker in corr_matrix.index:
-            low_corr_tickers = corr_matrix.index[
-                (np.abs(corr_matrix[ticker]) < threshold) & (corr_matrix.index != ticker)
-            ].tolist()
-            count = len(low_corr_tickers)
-            summary_data.append({
-                'Stock': ticker,
-                'Low Correlations Count': count,
-                'Low Correlation Partners': ', '.join(low_corr_tickers[:5]) + ('...' if len(low_corr_tickers) > 5 else '')
-            })
-        
-        summary_df = pd.DataFrame(summary_data).sort_values('Low Correlations Count', ascending=False)
-        st.dataframe(summary_df, use_container_width=True)
+        with st.expander("Company Details"):
+            st.dataframe(company_table(corr_matrix.index), use_container_width=True)
 
 # Footer
 st.markdown("---")
-st.markdown("""
-<div style='text-align: center; color: #666;'>
-    Trading Tools Dashboard | Built with Streamlit | 
-    <a href='https://github.com/theredplanetsings' target='_blank'>GitHub</a>
-</div>
-""", unsafe_allow_html=True)
+st.html(FOOTER_HTML)